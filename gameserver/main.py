@@ -1,16 +1,33 @@
 """Main application module for the GameServer."""
 
+import os
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from gameserver.api.router import api_router
+from gameserver.ws.endpoints import metaverse_v2
 from gameserver.ws.router import ws_router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own background tasks for the lifetime of the app."""
+    manager = metaverse_v2.server.manager
+    manager.start_heartbeat_monitor()
+    try:
+        yield
+    finally:
+        await manager.stop_heartbeat_monitor()
+
+
 app = FastAPI(
     title="GameServer",
     description="A game server with RESTful API and WebSocket interfaces",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -33,9 +50,32 @@ async def health_check():
     return {"status": "ok", "message": "GameServer is running"}
 
 
+def _event_loop() -> str:
+    """Pick the uvicorn event loop from GAMESERVER_USE_UVLOOP.
+
+    "1" forces uvloop, "0" falls back to the stdlib asyncio loop (e.g. on
+    Windows); unset keeps uvicorn's "auto", which prefers uvloop when installed.
+    """
+    flag = os.environ.get("GAMESERVER_USE_UVLOOP")
+    if flag == "1":
+        return "uvloop"
+    if flag == "0":
+        return "asyncio"
+    return "auto"
+
+
 def start():
     """Start the application server."""
-    uvicorn.run("gameserver.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run(
+        "gameserver.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        loop=_event_loop(),
+        # Large status/broadcast frames compress well; set to "0" on LANs
+        # where CPU, not bandwidth, is the bottleneck
+        ws_per_message_deflate=os.environ.get("GAMESERVER_WS_DEFLATE", "1") != "0",
+    )
 
 
 if __name__ == "__main__":
@@ -1,11 +1,17 @@
-"""Enhanced connection manager for WebSocket connections."""
+"""Enhanced connection manager for WebSocket connections.
 
-from typing import Dict, List, Optional, Set
-import json
+Every send is a plain await on the serving event loop, which is uvloop whenever
+uvicorn selects it (see GAMESERVER_USE_UVLOOP in main.py). Nothing here hands
+work to other threads, so the manager must only be used from that loop.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import time
+import orjson
 from fastapi import WebSocket
 
-from ..models import WSIDInfo, ClientType, ConnectionInfo
+from ..models import WSIDInfo, ClientType, WS_TYPE_MAP, ConnectionInfo
 from ..utils import (
     ClientNotFoundError,
     EnvironmentNotFoundError,
@@ -13,46 +19,57 @@ from ..utils import (
 )
 from gameserver.utils.log import get_logger
 
+# (client_type, client_id, env_id) identifying one connection
+ConnectionKey = Tuple[ClientType, Optional[int], Optional[int]]
+
 
 class ConnectionManager:
     """Enhanced manager for WebSocket connections with improved error handling and logging."""
 
-    def __init__(self):
+    def __init__(self, broadcast_timeout: float = 5.0):
         # Core data structures
-        self.envs: Dict[int, WebSocket] = {}
-        self.agents: Dict[int, Dict[int, WebSocket]] = (
-            {}
-        )  # agent_id -> {env_id -> websocket}
-        self.humans: Dict[int, Dict[int, WebSocket]] = (
-            {}
-        )  # human_id -> {env_id -> websocket}
-
-        # Environment membership tracking
-        self.env_agents: Dict[int, Set[int]] = {}  # env_id -> {agent_id}
-        self.env_humans: Dict[int, Set[int]] = {}  # env_id -> {human_id}
+        self.envs: Dict[int, WebSocket] = {}  # env_id -> websocket
+        # client_type -> {(client_id, env_id): websocket}
+        self.conns: Dict[ClientType, Dict[Tuple[int, int], WebSocket]] = {
+            ClientType.AGENT: {},
+            ClientType.HUMAN: {},
+        }
+
+        # Environment membership: client_type -> {env_id: {client_id: websocket}}
+        self.env_members: Dict[ClientType, Dict[int, Dict[int, WebSocket]]] = {
+            ClientType.AGENT: {},
+            ClientType.HUMAN: {},
+        }
 
         # Connection metadata
-        self.connection_times: Dict[str, float] = {}  # connection_key -> timestamp
-        self.last_ping_times: Dict[str, float] = {}  # connection_key -> timestamp
+        self.connection_times: Dict[ConnectionKey, float] = {}  # key -> timestamp
+        self.last_ping_times: Dict[ConnectionKey, float] = {}  # key -> timestamp
+
+        # Snapshot served by get_connection_info; None once membership changes
+        self._connection_info: Optional[ConnectionInfo] = None
+
+        # Seconds a broadcast waits for slow clients before dropping them
+        self.broadcast_timeout = broadcast_timeout
 
         self.logger = get_logger(__name__)
 
     def reset(self) -> None:
         """Reset all connections - useful for testing."""
         self.envs.clear()
-        self.agents.clear()
-        self.humans.clear()
-        self.env_agents.clear()
-        self.env_humans.clear()
+        for connections in self.conns.values():
+            connections.clear()
+        for members in self.env_members.values():
+            members.clear()
+        self._connection_info = None
         self.connection_times.clear()
         self.last_ping_times.clear()
         self.logger.info("Connection manager reset")
 
     def _get_connection_key(
         self, client_type: ClientType, client_id: Optional[int], env_id: Optional[int]
-    ) -> str:
+    ) -> ConnectionKey:
         """Generate a unique connection key."""
-        return f"{client_type.value}:{client_id or 'none'}:{env_id or 'none'}"
+        return (client_type, client_id, env_id)
 
     async def connect(
         self,
@@ -63,10 +80,11 @@ class ConnectionManager:
         human_id: Optional[int] = None,
     ) -> None:
         """Connect a client based on its type."""
-        client_type = ClientType(ws_type)
-        connection_key = self._get_connection_key(
-            client_type, agent_id or human_id, env_id
-        )
+        client_type = WS_TYPE_MAP.get(ws_type)
+        if client_type is None:
+            raise ValueError(f"Invalid WebSocket type: {ws_type}")
+        client_id = agent_id or human_id
+        connection_key = self._get_connection_key(client_type, client_id, env_id)
 
         # Accept connection first
         await websocket.accept()
@@ -74,21 +92,23 @@ class ConnectionManager:
         try:
             if client_type == ClientType.ENV:
                 await self._connect_environment(env_id, websocket)
-            elif client_type == ClientType.AGENT:
-                await self._connect_agent(agent_id, env_id, websocket)
-            elif client_type == ClientType.HUMAN:
-                await self._connect_human(human_id, env_id, websocket)
+            elif client_type in self.conns:
+                await self._connect_client(client_type, client_id, env_id, websocket)
             else:
                 raise ValueError(f"Invalid WebSocket type: {ws_type}")
 
             # Record connection metadata
             self.connection_times[connection_key] = time.time()
+            websocket.state.connection_key = connection_key
             self.logger.info(
-                f"Connected {client_type.value} (ID: {agent_id or human_id or env_id}, Env: {env_id})"
+                "Connected %s (ID: %s, Env: %s)",
+                client_type.value,
+                agent_id or human_id or env_id,
+                env_id,
             )
 
         except Exception as e:
-            self.logger.error(f"Failed to connect {ws_type}: {e}")
+            self.logger.error("Failed to connect %s: %s", ws_type, e)
             await websocket.close(code=1011, reason=str(e))
             raise
 
@@ -101,29 +121,47 @@ class ConnectionManager:
         human_id: Optional[int] = None,
     ) -> None:
         """Disconnect a client based on its type."""
-        client_type = ClientType(ws_type)
-        connection_key = self._get_connection_key(
-            client_type, agent_id or human_id, env_id
-        )
+        client_type = WS_TYPE_MAP.get(ws_type)
+        if client_type is None:
+            raise ValueError(f"Invalid WebSocket type: {ws_type}")
+        client_id = agent_id or human_id
+
+        # A socket that was replaced (or whose duplicate connect was rejected)
+        # must not unregister the connection now stored under the same ids
+        if client_type == ClientType.ENV:
+            current = self.envs.get(env_id)
+        else:
+            current = self.conns.get(client_type, {}).get((client_id, env_id))
+        if current is not None and current is not websocket:
+            self.logger.debug(
+                "Skipping disconnect of a stale %s socket (Env: %s)",
+                client_type.value,
+                env_id,
+            )
+            return
+
+        connection_key = self._get_connection_key(client_type, client_id, env_id)
 
         try:
             if client_type == ClientType.ENV:
                 self._disconnect_environment(env_id)
-            elif client_type == ClientType.AGENT:
-                self._disconnect_agent(agent_id, env_id)
-            elif client_type == ClientType.HUMAN:
-                self._disconnect_human(human_id, env_id)
-
-            # Clean up metadata
-            self.connection_times.pop(connection_key, None)
-            self.last_ping_times.pop(connection_key, None)
+            elif client_type in self.conns:
+                self._disconnect_client(client_type, client_id, env_id)
 
             self.logger.info(
-                f"Disconnected {client_type.value} (ID: {agent_id or human_id or env_id}, Env: {env_id})"
+                "Disconnected %s (ID: %s, Env: %s)",
+                client_type.value,
+                agent_id or human_id or env_id,
+                env_id,
             )
 
         except Exception as e:
-            self.logger.error(f"Error during disconnect: {e}")
+            self.logger.error("Error during disconnect: %s", e)
+
+        finally:
+            # Clean up metadata even if the type-specific teardown failed
+            self.connection_times.pop(connection_key, None)
+            self.last_ping_times.pop(connection_key, None)
 
     async def _connect_environment(self, env_id: int, websocket: WebSocket) -> None:
         """Connect an environment."""
@@ -132,149 +170,168 @@ class ConnectionManager:
 
         if env_id in self.envs:
             self.logger.warning(
-                f"Replacing existing environment connection for env_id {env_id}"
+                "Replacing existing environment connection for env_id %s", env_id
             )
 
         self.envs[env_id] = websocket
+        self._connection_info = None
 
         # Initialize client tracking for this environment
-        if env_id not in self.env_agents:
-            self.env_agents[env_id] = set()
-        if env_id not in self.env_humans:
-            self.env_humans[env_id] = set()
+        for members in self.env_members.values():
+            members.setdefault(env_id, {})
 
-    async def _connect_agent(
-        self, agent_id: int, env_id: int, websocket: WebSocket
-    ) -> None:
-        """Connect an agent to an environment."""
-        if agent_id is None or env_id is None:
-            raise ValueError("Agent ID and Environment ID cannot be None")
-
-        # Initialize agent's environment dict if needed
-        if agent_id not in self.agents:
-            self.agents[agent_id] = {}
-
-        # Check for duplicate connection
-        if env_id in self.agents[agent_id]:
-            raise DuplicateConnectionError(
-                f"Agent {agent_id} already connected to environment {env_id}"
-            )
-
-        # Store connection
-        self.agents[agent_id][env_id] = websocket
-
-        # Add to environment tracking
-        if env_id not in self.env_agents:
-            self.env_agents[env_id] = set()
-        self.env_agents[env_id].add(agent_id)
-
-    async def _connect_human(
-        self, human_id: int, env_id: int, websocket: WebSocket
+    async def _connect_client(
+        self,
+        client_type: ClientType,
+        client_id: int,
+        env_id: int,
+        websocket: WebSocket,
     ) -> None:
-        """Connect a human to an environment."""
-        if human_id is None or env_id is None:
-            raise ValueError("Human ID and Environment ID cannot be None")
-
-        # Initialize human's environment dict if needed
-        if human_id not in self.humans:
-            self.humans[human_id] = {}
+        """Connect an agent or human to an environment."""
+        label = client_type.value.capitalize()
+        if client_id is None or env_id is None:
+            raise ValueError(f"{label} ID and Environment ID cannot be None")
 
         # Check for duplicate connection
-        if env_id in self.humans[human_id]:
+        key = (client_id, env_id)
+        connections = self.conns[client_type]
+        if key in connections:
             raise DuplicateConnectionError(
-                f"Human {human_id} already connected to environment {env_id}"
+                f"{label} {client_id} already connected to environment {env_id}"
             )
 
         # Store connection
-        self.humans[human_id][env_id] = websocket
+        connections[key] = websocket
+        self._connection_info = None
 
         # Add to environment tracking
-        if env_id not in self.env_humans:
-            self.env_humans[env_id] = set()
-        self.env_humans[env_id].add(human_id)
+        self.env_members[client_type].setdefault(env_id, {})[client_id] = websocket
 
     def _disconnect_environment(self, env_id: int) -> None:
         """Disconnect an environment and clean up all related connections."""
         if env_id not in self.envs:
-            self.logger.warning(f"Environment {env_id} not found for disconnect")
+            self.logger.warning("Environment %s not found for disconnect", env_id)
             return
 
         # Remove environment
         del self.envs[env_id]
+        self._connection_info = None
 
         # Clean up client tracking
-        self.env_agents.pop(env_id, None)
-        self.env_humans.pop(env_id, None)
+        for members in self.env_members.values():
+            members.pop(env_id, None)
 
-    def _disconnect_agent(self, agent_id: int, env_id: int) -> None:
-        """Disconnect an agent from an environment."""
-        if agent_id in self.agents and env_id in self.agents[agent_id]:
-            del self.agents[agent_id][env_id]
-
-            # Clean up empty agent dict
-            if not self.agents[agent_id]:
-                del self.agents[agent_id]
+    def _disconnect_client(
+        self, client_type: ClientType, client_id: int, env_id: int
+    ) -> None:
+        """Disconnect an agent or human from an environment."""
+        if self.conns[client_type].pop((client_id, env_id), None) is not None:
+            self._connection_info = None
 
         # Remove from environment tracking
-        if env_id in self.env_agents:
-            self.env_agents[env_id].discard(agent_id)
+        members = self.env_members[client_type].get(env_id)
+        if members is not None:
+            members.pop(client_id, None)
 
-    def _disconnect_human(self, human_id: int, env_id: int) -> None:
-        """Disconnect a human from an environment."""
-        if human_id in self.humans and env_id in self.humans[human_id]:
-            del self.humans[human_id][env_id]
+    async def broadcast_to_env_clients(self, env_id: int, message: dict) -> int:
+        """
+        Broadcast a message to all clients in an environment.
 
-            # Clean up empty human dict
-            if not self.humans[human_id]:
-                del self.humans[human_id]
+        Sends are issued concurrently; clients whose send fails or does not
+        finish within broadcast_timeout are cleaned up like a regular disconnect.
 
-        # Remove from environment tracking
-        if env_id in self.env_humans:
-            self.env_humans[env_id].discard(human_id)
+        Returns:
+            Number of successful broadcasts
+        """
+        return await self.broadcast_prepared(env_id, orjson.dumps(message))
 
-    async def broadcast_to_env_clients(self, env_id: int, message: dict) -> int:
+    async def broadcast_batched(self, env_id: int, messages: List[dict]) -> int:
         """
-        Broadcast a message to all clients in an environment.
+        Broadcast several messages to an environment as one JSON array frame.
+
+        Clients receive a single frame per batch and must unpack the array.
 
         Returns:
             Number of successful broadcasts
         """
-        if env_id not in self.env_agents and env_id not in self.env_humans:
-            self.logger.warning(f"No clients found for env_id {env_id}")
+        if not messages:
             return 0
+        return await self.broadcast_prepared(env_id, orjson.dumps(messages))
+
+    async def broadcast_prepared(self, env_id: int, payload: bytes) -> int:
+        """
+        Send an already-encoded frame to every agent and human in an environment.
+
+        Lets callers that fan one body out to several environments encode it
+        only once.
+
+        Returns:
+            Number of successful broadcasts
+        """
+        if not any(env_id in members for members in self.env_members.values()):
+            self.logger.warning("No clients found for env_id %s", env_id)
+            return 0
+
+        targets = [
+            (client_type, client_id, websocket)
+            for client_type, members in self.env_members.items()
+            for client_id, websocket in members.get(env_id, {}).items()
+        ]
+        if not targets:
+            return 0
+
+        tasks = {
+            asyncio.create_task(websocket.send_bytes(payload)): (
+                client_type,
+                client_id,
+                websocket,
+            )
+            for client_type, client_id, websocket in targets
+        }
+        _, pending = await asyncio.wait(tasks, timeout=self.broadcast_timeout)
+        for task in pending:
+            task.cancel()
+
+        # Sweep clients whose send failed or timed out once the batch is done
+        failed = []
+        dropped = []
+        for task, (client_type, client_id, websocket) in tasks.items():
+            if task in pending:
+                reason = "timed out"
+            elif task.exception() is not None:
+                reason = task.exception()
+            else:
+                continue
+            failed.append(f"{client_type.value} {client_id} ({reason})")
+            dropped.append((client_type, client_id, websocket))
+
+        # Tell dropped peers they are gone instead of leaving them unreachable;
+        # a cancelled send may also have left a half-written frame behind
+        await asyncio.gather(
+            *(websocket.close(code=1011) for _, _, websocket in dropped),
+            return_exceptions=True,
+        )
+        for client_type, client_id, websocket in dropped:
+            # Skip ids that reconnected while the batch was in flight
+            if self.conns[client_type].get((client_id, env_id)) is not websocket:
+                continue
+            await self.disconnect(
+                client_type.value,
+                websocket,
+                env_id=env_id,
+                agent_id=client_id if client_type == ClientType.AGENT else None,
+                human_id=client_id if client_type == ClientType.HUMAN else None,
+            )
 
-        success_count = 0
-        message_json = json.dumps(message)
-
-        # Send to agents
-        for agent_id in self.env_agents.get(env_id, set()):
-            if agent_id in self.agents and env_id in self.agents[agent_id]:
-                try:
-                    await self.agents[agent_id][env_id].send_text(message_json)
-                    success_count += 1
-                    self.logger.debug(
-                        f"Broadcast sent to agent {agent_id} in env {env_id}"
-                    )
-                except Exception as e:
-                    self.logger.error(
-                        f"Failed to send broadcast to agent {agent_id}: {e}"
-                    )
-
-        # Send to humans
-        for human_id in self.env_humans.get(env_id, set()):
-            if human_id in self.humans and env_id in self.humans[human_id]:
-                try:
-                    await self.humans[human_id][env_id].send_text(message_json)
-                    success_count += 1
-                    self.logger.debug(
-                        f"Broadcast sent to human {human_id} in env {env_id}"
-                    )
-                except Exception as e:
-                    self.logger.error(
-                        f"Failed to send broadcast to human {human_id}: {e}"
-                    )
-
-        self.logger.info(f"Broadcast to env {env_id}: {success_count} successful sends")
+        if failed:
+            self.logger.error(
+                "Failed to send broadcast in env %s to: %s", env_id, ", ".join(failed)
+            )
+
+        success_count = len(targets) - len(failed)
+        self.logger.info(
+            "Broadcast to env %s: %s successful sends", env_id, success_count
+        )
         return success_count
 
     async def send_to_environment(self, env_id: int, message: dict) -> bool:
@@ -283,11 +340,11 @@ class ConnectionManager:
             raise EnvironmentNotFoundError(f"Environment {env_id} not found")
 
         try:
-            await self.envs[env_id].send_text(json.dumps(message))
-            self.logger.debug(f"Message sent to environment {env_id}")
+            await self.envs[env_id].send_bytes(orjson.dumps(message))
+            self.logger.debug("Message sent to environment %s", env_id)
             return True
         except Exception as e:
-            self.logger.error(f"Failed to send to environment {env_id}: {e}")
+            self.logger.error("Failed to send to environment %s: %s", env_id, e)
             return False
 
     async def send_direct_message(
@@ -299,72 +356,82 @@ class ConnectionManager:
     ) -> bool:
         """Send a message to a specific client."""
         try:
-            client_type = ClientType(target_type)
+            client_type = WS_TYPE_MAP.get(target_type)
 
             if client_type == ClientType.ENV:
                 if env_id is None:
                     raise ValueError("Environment ID required for environment messages")
                 return await self.send_to_environment(env_id, message)
 
-            elif client_type == ClientType.AGENT:
-                if target_id is None or env_id is None:
-                    raise ValueError(
-                        "Agent ID and Environment ID required for agent messages"
-                    )
-
-                if target_id not in self.agents or env_id not in self.agents[target_id]:
-                    raise ClientNotFoundError(
-                        f"Agent {target_id} not found in environment {env_id}"
-                    )
+            connections = self.conns.get(client_type)
+            if connections is None:
+                raise ValueError(f"Invalid target type: {target_type}")
 
-                await self.agents[target_id][env_id].send_text(json.dumps(message))
-                self.logger.debug(
-                    f"Direct message sent to agent {target_id} in env {env_id}"
+            label = client_type.value.capitalize()
+            if target_id is None or env_id is None:
+                raise ValueError(
+                    f"{label} ID and Environment ID required for "
+                    f"{client_type.value} messages"
                 )
-                return True
-
-            elif client_type == ClientType.HUMAN:
-                if target_id is None or env_id is None:
-                    raise ValueError(
-                        "Human ID and Environment ID required for human messages"
-                    )
-
-                if target_id not in self.humans or env_id not in self.humans[target_id]:
-                    raise ClientNotFoundError(
-                        f"Human {target_id} not found in environment {env_id}"
-                    )
-
-                await self.humans[target_id][env_id].send_text(json.dumps(message))
-                self.logger.debug(
-                    f"Direct message sent to human {target_id} in env {env_id}"
+
+            websocket = connections.get((target_id, env_id))
+            if websocket is None:
+                raise ClientNotFoundError(
+                    f"{label} {target_id} not found in environment {env_id}"
                 )
-                return True
 
-            else:
-                raise ValueError(f"Invalid target type: {target_type}")
+            await websocket.send_bytes(orjson.dumps(message))
+            self.logger.debug(
+                "Direct message sent to %s %s in env %s",
+                client_type.value,
+                target_id,
+                env_id,
+            )
+            return True
 
         except Exception as e:
-            self.logger.error(f"Failed to send direct message: {e}")
+            self.logger.error("Failed to send direct message: %s", e)
             return False
 
     def get_connection_info(self) -> ConnectionInfo:
-        """Get comprehensive connection information."""
-        return ConnectionInfo(
-            environments=list(self.envs.keys()),
-            agents={
-                agent_id: list(envs.keys()) for agent_id, envs in self.agents.items()
-            },
-            humans={
-                human_id: list(envs.keys()) for human_id, envs in self.humans.items()
-            },
-        )
+        """
+        Get comprehensive connection information.
 
-    def update_ping_time(
-        self, client_type: ClientType, client_id: Optional[int], env_id: Optional[int]
-    ) -> None:
-        """Update the last ping time for a client."""
-        connection_key = self._get_connection_key(client_type, client_id, env_id)
-        self.last_ping_times[connection_key] = time.time()
+        The snapshot is rebuilt only after a connect or disconnect, so callers
+        must treat the returned object as read-only.
+        """
+        if self._connection_info is None:
+            self._connection_info = ConnectionInfo(
+                environments=list(self.envs.keys()),
+                agents=self._envs_by_client(self.conns[ClientType.AGENT]),
+                humans=self._envs_by_client(self.conns[ClientType.HUMAN]),
+            )
+        return self._connection_info
+
+    def get_connection_counts(self) -> Dict[str, int]:
+        """Get connection counts without building the per-client listing."""
+        return {
+            "env_count": len(self.envs),
+            "agent_count": len(self.conns[ClientType.AGENT]),
+            "human_count": len(self.conns[ClientType.HUMAN]),
+        }
+
+    @staticmethod
+    def _envs_by_client(
+        connections: Dict[Tuple[int, int], WebSocket]
+    ) -> Dict[int, List[int]]:
+        """Group (client_id, env_id) connection keys into client_id -> [env_id]."""
+        grouped: Dict[int, List[int]] = {}
+        for client_id, env_id in connections:
+            grouped.setdefault(client_id, []).append(env_id)
+        return grouped
+
+    def update_ping_time(self, websocket: WebSocket) -> None:
+        """Update the last ping time for the client owning this websocket."""
+        connection_key = websocket.state.connection_key
+        # A ping racing a disconnect must not re-create the entry
+        if connection_key in self.connection_times:
+            self.last_ping_times[connection_key] = time.time()
 
     def is_client_connected(
         self, client_type: ClientType, client_id: Optional[int], env_id: Optional[int]
@@ -372,8 +439,5 @@ class ConnectionManager:
         """Check if a client is currently connected."""
         if client_type == ClientType.ENV:
             return env_id in self.envs
-        elif client_type == ClientType.AGENT:
-            return client_id in self.agents and env_id in self.agents[client_id]
-        elif client_type == ClientType.HUMAN:
-            return client_id in self.humans and env_id in self.humans[client_id]
-        return False
+        connections = self.conns.get(client_type)
+        return connections is not None and (client_id, env_id) in connections
@@ -1,14 +1,20 @@
 """Base message handler class."""
 
 from abc import ABC, abstractmethod
+from functools import partial
 import time
 from typing import Dict, Any
+import orjson
 from fastapi import WebSocket
 
-from ..models import WSMessage, WSIDInfo, ClientType
+from ..models import MessageType, SERVER_MSG_FROM
 from ..core.connection_manager import ConnectionManager
 from gameserver.utils.log import get_logger
 
+# Replies may carry int-keyed maps (e.g. client_id -> [env_id]), which orjson
+# only accepts with OPT_NON_STR_KEYS; bind the options once at import.
+_dumps = partial(orjson.dumps, option=orjson.OPT_NON_STR_KEYS)
+
 
 class BaseMessageHandler(ABC):
     """Base class for message handlers."""
@@ -22,6 +28,10 @@ class BaseMessageHandler(ABC):
         """Handle the message."""
         pass
 
+    async def _send(self, websocket: WebSocket, response: Dict[str, Any]) -> None:
+        """Encode a response and send it as a binary frame."""
+        await websocket.send_bytes(_dumps(response))
+
     def _build_hub_envelope(
         self, instruction: str, data: Any, target: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -29,7 +39,19 @@ class BaseMessageHandler(ABC):
         return {
             "instruction": instruction,
             "data": data,
-            "msg_from": WSIDInfo(role_type=ClientType.SERVER).model_dump(),
+            "msg_from": SERVER_MSG_FROM,
             "msg_to": target,
             "timestamp": time.time(),
         }
+
+    def _create_response(
+        self, instruction: str, data: Any, target: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Create a server response addressed to ``target``."""
+        return self._build_hub_envelope(instruction, data, target)
+
+    def _create_error_response(
+        self, error_message: str, target: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Create a server error response addressed to ``target``."""
+        return self._build_hub_envelope(MessageType.ERROR.value, error_message, target)
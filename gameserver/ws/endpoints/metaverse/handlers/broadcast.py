@@ -1,6 +1,5 @@
 """Broadcast message handler."""
 
-import json
 from typing import Dict, Any
 from fastapi import WebSocket
 
@@ -12,22 +11,22 @@ class BroadcastHandler(BaseMessageHandler):
 
     async def handle(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
         """Handle broadcast messages."""
+        msg_from = message.get("msg_from", {})
         try:
-            msg_from = message.get("msg_from", {})
             env_id = msg_from.get("env_id")
 
             if not env_id:
                 error_response = self._create_error_response(
                     "Broadcast message must include env_id", msg_from
                 )
-                await websocket.send_text(json.dumps(error_response))
+                await self._send(websocket, error_response)
                 return
 
             # Broadcast to all clients in the environment
             success_count = await self.manager.broadcast_to_env_clients(env_id, message)
 
             self.logger.info(
-                f"Broadcast from env {env_id} sent to {success_count} clients"
+                "Broadcast from env %s sent to %s clients", env_id, success_count
             )
 
             # Optionally send confirmation back to sender
@@ -37,11 +36,11 @@ class BroadcastHandler(BaseMessageHandler):
                     data=f"No clients found in environment {env_id}",
                     target=msg_from,
                 )
-                await websocket.send_text(json.dumps(warning_response))
+                await self._send(websocket, warning_response)
 
         except Exception as e:
-            self.logger.error(f"Failed to handle broadcast: {e}")
+            self.logger.error("Failed to handle broadcast: %s", e)
             error_response = self._create_error_response(
-                f"Broadcast failed: {str(e)}", message.get("msg_from", {})
+                f"Broadcast failed: {str(e)}", msg_from
             )
-            await websocket.send_text(json.dumps(error_response))
+            await self._send(websocket, error_response)
@@ -1,23 +1,24 @@
 """Echo message handler for testing."""
 
-import json
 from typing import Dict, Any
 from fastapi import WebSocket
 
 from .base import BaseMessageHandler
 
+_FORWARD_ROLES = frozenset(("agent", "human", "env"))
+
 
 class EchoHandler(BaseMessageHandler):
     """Handler for echo messages - useful for testing."""
 
     async def handle(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
         """Handle echo messages."""
+        msg_from = message.get("msg_from", {})
         try:
-            msg_from = message.get("msg_from", {})
             msg_to = message.get("msg_to", {})
             to_type = msg_to.get("role_type") if msg_to else None
 
-            if to_type and to_type in ["agent", "human", "env"]:
+            if to_type in _FORWARD_ROLES:
                 # Forward to the specified target
                 target_client_id = msg_to.get("agent_id") or msg_to.get("human_id")
                 target_env_id = msg_to.get("env_id")
@@ -30,7 +31,7 @@ class EchoHandler(BaseMessageHandler):
                     error_response = self._create_error_response(
                         f"Failed to forward echo to {to_type}", msg_from
                     )
-                    await websocket.send_text(json.dumps(error_response))
+                    await self._send(websocket, error_response)
             else:
                 # Echo back to sender
                 response = self._create_response(
@@ -39,14 +40,14 @@ class EchoHandler(BaseMessageHandler):
                     target=msg_from,
                 )
 
-                await websocket.send_text(json.dumps(response))
+                await self._send(websocket, response)
                 self.logger.info(
-                    f"Echoed message back to {msg_from.get('role_type', 'unknown')}"
+                    "Echoed message back to %s", msg_from.get("role_type", "unknown")
                 )
 
         except Exception as e:
-            self.logger.error(f"Failed to handle echo: {e}")
+            self.logger.error("Failed to handle echo: %s", e)
             error_response = self._create_error_response(
-                f"Echo failed: {str(e)}", message.get("msg_from", {})
+                f"Echo failed: {str(e)}", msg_from
             )
-            await websocket.send_text(json.dumps(error_response))
+            await self._send(websocket, error_response)
@@ -1,11 +1,9 @@
 """Ping/Heartbeat message handler."""
 
-import json
 from typing import Dict, Any
 from fastapi import WebSocket
 
 from .base import BaseMessageHandler
-from ..models import ClientType
 
 
 class HeartbeatHandler(BaseMessageHandler):
@@ -13,17 +11,12 @@ class HeartbeatHandler(BaseMessageHandler):
 
     async def handle(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
         """Handle ping messages for heartbeat monitoring."""
+        msg_from = message.get("msg_from", {})
         try:
-            msg_from = message.get("msg_from", {})
             envelope_timestamp = message.get("timestamp")
 
             # Update ping time for connection monitoring
-            client_type = ClientType(msg_from.get("role_type", "unknown"))
-            client_id = msg_from.get("agent_id") or msg_from.get("human_id")
-            env_id = msg_from.get("env_id")
-
-            if client_type != ClientType.SERVER:
-                self.manager.update_ping_time(client_type, client_id, env_id)
+            self.manager.update_ping_time(websocket)
 
             # Respond with pong
             response = self._create_response(
@@ -35,12 +28,12 @@ class HeartbeatHandler(BaseMessageHandler):
                 target=msg_from,
             )
 
-            await websocket.send_text(json.dumps(response))
-            self.logger.debug(f"Pong sent to {client_type.value}")
+            await self._send(websocket, response)
+            self.logger.debug("Pong sent to %s", msg_from.get("role_type"))
 
         except Exception as e:
-            self.logger.error(f"Failed to handle ping: {e}")
+            self.logger.error("Failed to handle ping: %s", e)
             error_response = self._create_error_response(
-                f"Failed to process ping: {str(e)}", message.get("msg_from", {})
+                f"Failed to process ping: {str(e)}", msg_from
             )
-            await websocket.send_text(json.dumps(error_response))
+            await self._send(websocket, error_response)
@@ -1,6 +1,5 @@
 """Direct message handler."""
 
-import json
 from typing import Dict, Any
 from fastapi import WebSocket
 
@@ -8,14 +7,17 @@ from .base import BaseMessageHandler
 from ..models import ClientType
 from ..utils import ClientNotFoundError, EnvironmentNotFoundError
 
+# Target roles addressed by (client_id, env_id) rather than env_id alone
+_CLIENT_ROLES = frozenset((ClientType.AGENT.value, ClientType.HUMAN.value))
+
 
 class MessageHandler(BaseMessageHandler):
     """Handler for direct messages between clients."""
 
     async def handle(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
         """Handle direct messages."""
+        msg_from = message.get("msg_from", {})
         try:
-            msg_from = message.get("msg_from", {})
             msg_to = message.get("msg_to", {})
 
             # Validate message structure
@@ -36,7 +38,7 @@ class MessageHandler(BaseMessageHandler):
             target_env_id = msg_to.get("env_id")
             target_client_id = msg_to.get("agent_id") or msg_to.get("human_id")
 
-            if target_type in ["agent", "human"] and not target_client_id:
+            if target_type in _CLIENT_ROLES and not target_client_id:
                 await self._send_error(
                     websocket,
                     f"Direct message to {target_type} must specify {target_type}_id",
@@ -47,7 +49,10 @@ class MessageHandler(BaseMessageHandler):
             # Send the message
             from_type = msg_from.get("role_type", "unknown")
             self.logger.info(
-                f"Routing direct message from {from_type} to {target_type} {target_client_id or target_env_id}"
+                "Routing direct message from %s to %s %s",
+                from_type,
+                target_type,
+                target_client_id or target_env_id,
             )
 
             success = await self.manager.send_direct_message(
@@ -62,16 +67,14 @@ class MessageHandler(BaseMessageHandler):
                 )
 
         except (ClientNotFoundError, EnvironmentNotFoundError) as e:
-            await self._send_error(websocket, str(e), message.get("msg_from", {}))
+            await self._send_error(websocket, str(e), msg_from)
         except Exception as e:
-            self.logger.error(f"Failed to handle direct message: {e}")
-            await self._send_error(
-                websocket, f"Server error: {str(e)}", message.get("msg_from", {})
-            )
+            self.logger.error("Failed to handle direct message: %s", e)
+            await self._send_error(websocket, f"Server error: {str(e)}", msg_from)
 
     async def _send_error(
         self, websocket: WebSocket, error_message: str, target: Dict[str, Any]
     ) -> None:
         """Send error response to client."""
         error_response = self._create_error_response(error_message, target)
-        await websocket.send_text(json.dumps(error_response))
+        await self._send(websocket, error_response)
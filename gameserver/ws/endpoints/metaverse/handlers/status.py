@@ -1,6 +1,5 @@
 """Status message handler."""
 
-import json
 from typing import Dict, Any
 from fastapi import WebSocket
 
@@ -13,33 +12,39 @@ class StatusHandler(BaseMessageHandler):
 
     async def handle(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
         """Handle status request messages."""
+        msg_from = message.get("msg_from", {})
         try:
-            connection_info = self.manager.get_connection_info()
+            data = message.get("data")
+            if isinstance(data, dict) and data.get("summary_only"):
+                # Counts only: skip materializing every client's env list
+                connections = {
+                    "total_connections": self.manager.get_connection_counts()
+                }
+            else:
+                connection_info = self.manager.get_connection_info()
+                connections = {
+                    "environments": connection_info.environments,
+                    "agents": connection_info.agents,
+                    "humans": connection_info.humans,
+                    "total_connections": {
+                        "env_count": connection_info.env_count,
+                        "agent_count": connection_info.agent_count,
+                        "human_count": connection_info.human_count,
+                    },
+                }
 
             response = self._create_response(
                 instruction="message",
-                data={
-                    "status": "ok",
-                    "connections": {
-                        "environments": connection_info.environments,
-                        "agents": connection_info.agents,
-                        "humans": connection_info.humans,
-                        "total_connections": {
-                            "env_count": connection_info.env_count,
-                            "agent_count": connection_info.agent_count,
-                            "human_count": connection_info.human_count,
-                        },
-                    },
-                },
-                target=message.get("msg_from", {}),
+                data={"status": "ok", "connections": connections},
+                target=msg_from,
             )
 
-            await websocket.send_text(json.dumps(response))
+            await self._send(websocket, response)
             self.logger.info("Status information sent")
 
         except Exception as e:
-            self.logger.error(f"Failed to handle status request: {e}")
+            self.logger.error("Failed to handle status request: %s", e)
             error_response = self._create_error_response(
-                f"Failed to get status: {str(e)}", message.get("msg_from", {})
+                f"Failed to get status: {str(e)}", msg_from
             )
-            await websocket.send_text(json.dumps(error_response))
+            await self._send(websocket, error_response)
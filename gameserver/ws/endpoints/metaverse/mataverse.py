@@ -1,9 +1,13 @@
 """Refactored WebSocket endpoints for the star server."""
 
-import json
-from typing import Dict, Optional, Callable
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Callable, Union
+
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
-from .models import WSMessage, WSIDInfo, ClientType, MessageType
+from .models import ClientType, MessageType, SERVER_MSG_FROM
 from .core.connection_manager import ConnectionManager
 from .handlers import (
     StatusHandler,
@@ -13,13 +17,39 @@ from .handlers import (
 from .utils import ValidationError
 from gameserver.utils.log import get_logger
 
+# Yield to the event loop every N frames so one busy client cannot starve others
+_YIELD_EVERY = 32
+
+_ERROR = MessageType.ERROR.value
+
+# Invalid-JSON replies never vary except for the timestamp, so encode the rest
+# once and append the timestamp (the closing brace is stripped here)
+_INVALID_JSON_PREFIX = (
+    orjson.dumps(
+        {
+            "instruction": _ERROR,
+            "data": "Validation error: Invalid JSON format",
+            "msg_from": SERVER_MSG_FROM,
+        }
+    )[:-1]
+    + b',"timestamp":'
+)
+
+# Unknown-type replies only vary in the echoed instruction, the timestamp and
+# the sender they are addressed to; the rest is encoded once around those
+_UNKNOWN_TYPE_HEAD = orjson.dumps({"instruction": _ERROR})[:-1] + b',"data":'
+_UNKNOWN_TYPE_MID = (
+    b',"msg_from":' + orjson.dumps(SERVER_MSG_FROM) + b',"timestamp":'
+)
+
 
 class MetaverseWebSocketServer:
     """Enhanced WebSocket server for metaverse communication."""
 
     def __init__(self):
         self.manager = ConnectionManager()
-        self.logger = get_logger(__name__, level="debug")
+        self.logger = get_logger(__name__)
+        self.logger.setLevel(logging.DEBUG)
         self.router = APIRouter()
 
         # Initialize message handlers
@@ -34,38 +64,55 @@ class MetaverseWebSocketServer:
     def _setup_routes(self) -> None:
         """Setup WebSocket routes."""
 
-        @self.router.websocket("/ws/metaverse/{ws_type}/{env_id}")
-        async def env_websocket(websocket: WebSocket, ws_type: str, env_id: int):
+        # Per-type routes carry the client type in the path; Starlette tries
+        # routes in registration order, so these win over the catch-alls below
+        @self.router.websocket("/ws/metaverse/env/{env_id}")
+        async def env_websocket(websocket: WebSocket, env_id: int):
             """WebSocket endpoint for environments."""
-            if ws_type != ClientType.ENV.value:
-                await websocket.close(
-                    code=status.WS_1008_POLICY_VIOLATION,
-                    reason=f"Invalid WebSocket type: {ws_type}",
-                )
-                return
+            await self._handle_websocket_connection(
+                websocket, ws_type=ClientType.ENV.value, env_id=env_id
+            )
+
+        @self.router.websocket("/ws/metaverse/agent/{env_id}/{client_id}")
+        async def agent_websocket(websocket: WebSocket, env_id: int, client_id: int):
+            """WebSocket endpoint for agents."""
+            await self._handle_websocket_connection(
+                websocket,
+                ws_type=ClientType.AGENT.value,
+                env_id=env_id,
+                agent_id=client_id,
+            )
 
+        @self.router.websocket("/ws/metaverse/human/{env_id}/{client_id}")
+        async def human_websocket(websocket: WebSocket, env_id: int, client_id: int):
+            """WebSocket endpoint for humans."""
             await self._handle_websocket_connection(
-                websocket, ws_type=ws_type, env_id=env_id
+                websocket,
+                ws_type=ClientType.HUMAN.value,
+                env_id=env_id,
+                human_id=client_id,
             )
 
+        # Deprecated: the old {ws_type} catch-alls are now only reached by
+        # unknown client types, which are rejected as before
+        @self.router.websocket("/ws/metaverse/{ws_type}/{env_id}")
+        async def legacy_env_websocket(websocket: WebSocket, ws_type: str, env_id: int):
+            """Reject unknown environment WebSocket types."""
+            await self._reject_ws_type(websocket, ws_type)
+
         @self.router.websocket("/ws/metaverse/{ws_type}/{env_id}/{client_id}")
-        async def client_websocket(
+        async def legacy_client_websocket(
             websocket: WebSocket, ws_type: str, env_id: int, client_id: int
         ):
-            """WebSocket endpoint for agents and humans."""
-            if ws_type == ClientType.AGENT.value:
-                await self._handle_websocket_connection(
-                    websocket, ws_type=ws_type, env_id=env_id, agent_id=client_id
-                )
-            elif ws_type == ClientType.HUMAN.value:
-                await self._handle_websocket_connection(
-                    websocket, ws_type=ws_type, env_id=env_id, human_id=client_id
-                )
-            else:
-                await websocket.close(
-                    code=status.WS_1008_POLICY_VIOLATION,
-                    reason=f"Invalid WebSocket type: {ws_type}",
-                )
+            """Reject unknown client WebSocket types."""
+            await self._reject_ws_type(websocket, ws_type)
+
+    async def _reject_ws_type(self, websocket: WebSocket, ws_type: str) -> None:
+        """Close a connection whose path names an unknown client type."""
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION,
+            reason=f"Invalid WebSocket type: {ws_type}",
+        )
 
     async def _handle_websocket_connection(
         self,
@@ -99,10 +146,14 @@ class MetaverseWebSocketServer:
 
         except WebSocketDisconnect:
             self.logger.info(
-                f"WebSocket disconnected: {ws_type} (env: {env_id}, agent: {agent_id}, human: {human_id})"
+                "WebSocket disconnected: %s (env: %s, agent: %s, human: %s)",
+                ws_type,
+                env_id,
+                agent_id,
+                human_id,
             )
         except Exception as e:
-            self.logger.error(f"Unexpected error in WebSocket handler: {e}")
+            self.logger.error("Unexpected error in WebSocket handler: %s", e)
         finally:
             # Always ensure cleanup
             await self.manager.disconnect(
@@ -123,20 +174,22 @@ class MetaverseWebSocketServer:
     ) -> None:
         """Send connection confirmation message."""
 
-        confirmation = WSMessage(
-            instruction=MessageType.CONNECT,
-            data=f"Connected as {ws_type} to environment {env_id}",
-            msg_from=WSIDInfo(role_type=ClientType.SERVER),
-            msg_to=WSIDInfo(
-                role_type=ClientType(ws_type),
-                env_id=env_id,
-                agent_id=agent_id,
-                human_id=human_id,
-            ),
-        )
+        # ws_type was already validated by manager.connect
+        confirmation = {
+            "instruction": MessageType.CONNECT.value,
+            "data": f"Connected as {ws_type} to environment {env_id}",
+            "msg_from": SERVER_MSG_FROM,
+            "msg_to": {
+                "role_type": ws_type,
+                "env_id": env_id,
+                "agent_id": agent_id,
+                "human_id": human_id,
+            },
+            "timestamp": time.time(),
+        }
 
-        await websocket.send_text(confirmation.model_dump_json())
-        self.logger.info(f"Connection confirmed for {ws_type}")
+        await websocket.send_bytes(orjson.dumps(confirmation))
+        self.logger.info("Connection confirmed for %s", ws_type)
 
     async def _message_processing_loop(
         self,
@@ -148,10 +201,19 @@ class MetaverseWebSocketServer:
     ) -> None:
         """Main message processing loop."""
 
+        processed = 0
         while True:
+            processed += 1
+            if processed % _YIELD_EVERY == 0:
+                await asyncio.sleep(0)
             try:
-                # Receive message
-                data = await websocket.receive_text()
+                # Receive message (text or binary frame) without forcing a str decode
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(
+                        frame.get("code", 1000), frame.get("reason")
+                    )
+                data = frame.get("bytes") or frame.get("text") or b""
                 message = await self._parse_and_validate_message(
                     data, ws_type, env_id, agent_id, human_id
                 )
@@ -162,27 +224,28 @@ class MetaverseWebSocketServer:
             except WebSocketDisconnect:
                 # Re-raise to be handled by outer try-catch
                 raise
+            except orjson.JSONDecodeError:
+                await self._send_invalid_json_error(websocket)
             except ValidationError as e:
                 await self._send_validation_error(websocket, str(e))
-            except json.JSONDecodeError:
-                await self._send_json_error(websocket, data)
             except Exception as e:
                 await self._send_processing_error(websocket, str(e))
 
     async def _parse_and_validate_message(
         self,
-        data: str,
+        data: Union[str, bytes],
         ws_type: str,
         env_id: Optional[int],
         agent_id: Optional[int],
         human_id: Optional[int],
     ) -> Optional[Dict]:
-        """Parse and validate incoming message."""
+        """Parse and validate incoming message.
 
-        try:
-            message = json.loads(data)
-        except json.JSONDecodeError:
-            raise ValidationError("Invalid JSON format")
+        Undecodable frames raise ``orjson.JSONDecodeError``, which the
+        processing loop answers with the pre-encoded invalid-JSON reply.
+        """
+
+        message = orjson.loads(data)
 
         # Standardize message format
         self._standardize_message_format(message)
@@ -195,7 +258,7 @@ class MetaverseWebSocketServer:
         if not msg_ins:
             raise ValidationError("Message must include 'ins' field")
 
-        self.logger.debug(f"Received {msg_ins} from {ws_type}")
+        self.logger.debug("Received %s from %s", msg_ins, ws_type)
         return message
 
     def _standardize_message_format(self, message: Dict) -> None:
@@ -238,66 +301,56 @@ class MetaverseWebSocketServer:
         else:
             await self._send_unknown_message_error(websocket, msg_ins, message)
 
-    async def _send_validation_error(
-        self, websocket: WebSocket, error_message: str
+    async def _send_error(
+        self, websocket: WebSocket, data: str, msg_to: Optional[Dict] = None
     ) -> None:
-        """Send validation error response."""
-
+        """Send a server error frame, optionally addressed to the sender."""
         error_response = {
-            "instruction": MessageType.ERROR.value,
-            "data": f"Validation error: {error_message}",
-            "msg_from": WSIDInfo(role_type=ClientType.SERVER).model_dump(),
-            "timestamp": WSMessage(instruction=MessageType.ERROR, data="").timestamp,
+            "instruction": _ERROR,
+            "data": data,
+            "msg_from": SERVER_MSG_FROM,
+            "timestamp": time.time(),
         }
+        if msg_to is not None:
+            error_response["msg_to"] = msg_to
 
-        await websocket.send_text(json.dumps(error_response))
-
-    async def _send_json_error(self, websocket: WebSocket, invalid_data: str) -> None:
-        """Send JSON parsing error response."""
+        await websocket.send_bytes(orjson.dumps(error_response))
 
-        self.logger.error(f"Invalid JSON received: {invalid_data[:100]}...")
-
-        error_response = {
-            "instruction": MessageType.ERROR.value,
-            "data": "Invalid JSON format",
-            "msg_from": WSIDInfo(role_type=ClientType.SERVER).model_dump(),
-            "timestamp": WSMessage(instruction=MessageType.ERROR, data="").timestamp,
-        }
+    async def _send_validation_error(
+        self, websocket: WebSocket, error_message: str
+    ) -> None:
+        """Send validation error response."""
+        await self._send_error(websocket, f"Validation error: {error_message}")
 
-        await websocket.send_text(json.dumps(error_response))
+    async def _send_invalid_json_error(self, websocket: WebSocket) -> None:
+        """Send the invalid JSON validation error from its pre-encoded frame."""
+        await websocket.send_bytes(
+            _INVALID_JSON_PREFIX + repr(time.time()).encode() + b"}"
+        )
 
     async def _send_processing_error(
         self, websocket: WebSocket, error_message: str
     ) -> None:
         """Send general processing error response."""
 
-        self.logger.error(f"Error processing message: {error_message}")
-
-        error_response = {
-            "instruction": MessageType.ERROR.value,
-            "data": f"Server error: {error_message}",
-            "msg_from": WSIDInfo(role_type=ClientType.SERVER).model_dump(),
-            "timestamp": WSMessage(instruction=MessageType.ERROR, data="").timestamp,
-        }
-
-        await websocket.send_text(json.dumps(error_response))
+        self.logger.error("Error processing message: %s", error_message)
+        await self._send_error(websocket, f"Server error: {error_message}")
 
     async def _send_unknown_message_error(
         self, websocket: WebSocket, msg_ins: str, message: Dict
     ) -> None:
         """Send unknown message type error response."""
 
-        self.logger.warning(f"Unknown message type: {msg_ins}")
-
-        error_response = {
-            "instruction": MessageType.ERROR.value,
-            "data": f"Unknown message type: {msg_ins}",
-            "msg_from": WSIDInfo(role_type=ClientType.SERVER).model_dump(),
-            "msg_to": message.get("msg_from", {}),
-            "timestamp": WSMessage(instruction=MessageType.ERROR, data="").timestamp,
-        }
-
-        await websocket.send_text(json.dumps(error_response))
+        self.logger.warning("Unknown message type: %s", msg_ins)
+        await websocket.send_bytes(
+            _UNKNOWN_TYPE_HEAD
+            + orjson.dumps(f"Unknown message type: {msg_ins}")
+            + _UNKNOWN_TYPE_MID
+            + repr(time.time()).encode()
+            + b',"msg_to":'
+            + orjson.dumps(message.get("msg_from", {}))
+            + b"}"
+        )
 
 
 # Create server instance and export router
@@ -1,6 +1,13 @@
 """Message models for WebSocket communication."""
 
-from .message import WSMessage, WSIDInfo, MessageType, ClientType
+from .message import (
+    WSMessage,
+    WSIDInfo,
+    MessageType,
+    ClientType,
+    WS_TYPE_MAP,
+    SERVER_MSG_FROM,
+)
 from .connection import ConnectionInfo
 
 __all__ = [
@@ -8,5 +15,7 @@ __all__ = [
     "WSIDInfo",
     "MessageType",
     "ClientType",
+    "WS_TYPE_MAP",
+    "SERVER_MSG_FROM",
     "ConnectionInfo",
 ]
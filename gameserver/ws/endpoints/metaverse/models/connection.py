@@ -1,5 +1,6 @@
 """Connection information models."""
 
+from functools import cached_property
 from typing import Dict, List, Optional
 from pydantic import BaseModel
 
@@ -7,23 +8,26 @@ from .message import ClientType
 
 
 class ConnectionInfo(BaseModel):
-    """Connection information for status reporting."""
+    """Connection information for status reporting.
+
+    Instances are read-only snapshots, so the counts are computed once.
+    """
 
     environments: List[int]
     agents: Dict[int, List[int]]  # agent_id -> [env_id]
     humans: Dict[int, List[int]]  # human_id -> [env_id]
 
-    @property
+    @cached_property
     def env_count(self) -> int:
         """Number of connected environments."""
         return len(self.environments)
 
-    @property
+    @cached_property
     def agent_count(self) -> int:
         """Total number of connected agents."""
         return sum(len(envs) for envs in self.agents.values())
 
-    @property
+    @cached_property
     def human_count(self) -> int:
         """Total number of connected humans."""
         return sum(len(envs) for envs in self.humans.values())
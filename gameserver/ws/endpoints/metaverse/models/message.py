@@ -17,6 +17,10 @@ class ClientType(str, Enum):
     HUB = "hub"
 
 
+# Wire value -> ClientType, a plain dict probe instead of Enum.__call__
+WS_TYPE_MAP = {client_type.value: client_type for client_type in ClientType}
+
+
 class MessageType(str, Enum):
     """Message type enumeration."""
 
@@ -50,6 +54,10 @@ class WSIDInfo(BaseModel):
         return hash((self.role_type, self.env_id, self.agent_id, self.human_id))
 
 
+# Sender info stamped on every server-originated frame; shared, do not mutate
+SERVER_MSG_FROM = WSIDInfo(role_type=ClientType.SERVER).model_dump(mode="json")
+
+
 class WSMessage(BaseModel):
     """WebSocket message model."""
 
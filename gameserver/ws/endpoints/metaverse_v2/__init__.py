@@ -1 +1 @@
-from .mataverse import router
+from .mataverse import router, server
@@ -4,9 +4,10 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 import time
 from typing import Dict, Any
+import orjson
 from fastapi import WebSocket
 
-from ..models import Envelope, ClientInfo, ClientType
+from ..models import HUB_SENDER
 from ..manager.connection_manager import ConnectionManager
 from gameserver.utils.log import get_logger
 
@@ -23,6 +24,10 @@ class BaseMessageHandler(ABC):
         """Handle the message."""
         pass
 
+    async def _send(self, websocket: WebSocket, response: Dict[str, Any]) -> None:
+        """Encode a response and send it as a binary frame."""
+        await websocket.send_bytes(orjson.dumps(response))
+
     def _build_hub_envelope(
         self, msg_type: str, payload: Any, target: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -30,7 +35,7 @@ class BaseMessageHandler(ABC):
         return {
             "type": msg_type,
             "payload": payload,
-            "sender": ClientInfo(type=ClientType.HUB).model_dump(),
+            "sender": HUB_SENDER,
             "msg_to": target,
             "timestamp": datetime.now().timestamp(),
         }
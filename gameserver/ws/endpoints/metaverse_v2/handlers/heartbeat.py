@@ -1,11 +1,9 @@
 """Ping/Heartbeat message handler."""
 
-import json
 from typing import Dict, Any
 from fastapi import WebSocket
 
 from .base import BaseMessageHandler
-from ..models import ClientType
 
 
 class HeartbeatHandler(BaseMessageHandler):
@@ -13,12 +11,11 @@ class HeartbeatHandler(BaseMessageHandler):
 
     async def handle(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
         """Handle ping messages for heartbeat monitoring."""
+        sender = message.get("sender", {})
         try:
-            sender = message.get("sender", {})
             envelope_timestamp = message.get("timestamp")
 
-            if sender.get("type") != ClientType.HUB.value:
-                self.manager.update_heartbeat_time(sender)
+            self.manager.update_heartbeat_time(websocket)
 
             # self.logger.info(f"Heartbeat received from {sender.get('id')}")
             response = self._build_hub_envelope(
@@ -28,7 +25,7 @@ class HeartbeatHandler(BaseMessageHandler):
                 },
                 target=sender,
             )
-            await websocket.send_text(json.dumps(response))
+            await self._send(websocket, response)
 
         except Exception as e:
             self.logger.error(f"Failed to handle heartbeat: {e}")
@@ -40,4 +37,4 @@ class HeartbeatHandler(BaseMessageHandler):
                 },
                 target=sender,
             )
-            await websocket.send_text(json.dumps(error_response))
+            await self._send(websocket, error_response)
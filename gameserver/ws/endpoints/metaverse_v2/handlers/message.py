@@ -1,7 +1,5 @@
 """Direct message handler."""
 
-import json
-import traceback
 from typing import Dict, Any
 from fastapi import WebSocket
 
@@ -15,8 +13,8 @@ class MessageHandler(BaseMessageHandler):
 
     async def handle(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
         """Handle direct messages."""
+        sender = message.get("sender", {})
         try:
-            sender = message.get("sender", {})
             recipient = message.get("recipient", {})
 
             # 详细检查发送者和接收者格式
@@ -35,8 +33,12 @@ class MessageHandler(BaseMessageHandler):
             recipient_type = recipient.get("type")
             recipient_id = recipient.get("id")
 
-            self.logger.info(
-                f"Routing direct message from {sender_type}:{sender_id} to {recipient_type}:{recipient_id}"
+            self.logger.debug(
+                "Routing direct message from %s:%s to %s:%s",
+                sender_type,
+                sender_id,
+                recipient_type,
+                recipient_id,
             )
 
             # 路由检测：验证接收者类型和ID的有效性
@@ -59,7 +61,9 @@ class MessageHandler(BaseMessageHandler):
                 )
 
             success = await self.manager.route_message(sender, recipient, message)
-            self.logger.info(f"Message routing {'succeeded' if success else 'failed'}")
+            self.logger.debug(
+                "Message routing %s", "succeeded" if success else "failed"
+            )
 
             if not success:
                 await self._send_error(
@@ -70,45 +74,31 @@ class MessageHandler(BaseMessageHandler):
                 )
 
         except (ClientNotFoundError, EnvironmentNotFoundError) as e:
-            self.logger.error(f"Client/Environment not found: {e}")
-            await self._send_error(websocket, str(e), sender, traceback.format_exc())
+            self.logger.error("Client/Environment not found: %s", e)
+            await self._send_error(websocket, str(e), sender)
         except ValueError as e:
-            self.logger.error(f"Validation error in message handling: {e}")
+            self.logger.error("Validation error in message handling: %s", e)
             await self._send_error(
-                websocket,
-                f"Message validation error: {str(e)}",
-                sender,
-                traceback.format_exc(),
+                websocket, f"Message validation error: {str(e)}", sender
             )
         except Exception as e:
-            error_details = {
-                "error": str(e),
-                "traceback": traceback.format_exc(),
-                "message_data": message,
-            }
-            self.logger.error(f"Unexpected error in message handler: {error_details}")
-            await self._send_error(
-                websocket, f"Server error: {str(e)}", sender, traceback.format_exc()
-            )
+            self.logger.error("Unexpected error in message handler: %s", e)
+            # The stack is only formatted when DEBUG is enabled
+            self.logger.debug("Message handler traceback", exc_info=True)
+            await self._send_error(websocket, f"Server error: {str(e)}", sender)
 
     async def _send_error(
         self,
         websocket: WebSocket,
         error_message: str,
         target: Dict[str, Any],
-        traceback_info: str = None,
         additional_info: str = None,
     ) -> None:
-        """Send error response to client."""
-        error_payload = {
-            "error": error_message,
-            "debug_info": (
-                traceback_info if traceback_info else "No traceback available"
-            ),
-        }
+        """Send error response to client; tracebacks stay in the server log."""
+        error_payload = {"error": error_message}
 
         if additional_info:
             error_payload["additional_info"] = additional_info
 
         error_response = self._build_hub_envelope("error", error_payload, target)
-        await websocket.send_text(json.dumps(error_response))
+        await self._send(websocket, error_response)
@@ -1,6 +1,5 @@
 """Status message handler."""
 
-import json
 from typing import Dict, Any
 from fastapi import WebSocket
 
@@ -14,6 +13,7 @@ class StatusHandler(BaseMessageHandler):
     async def handle(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
         """Handle status request messages."""
         self.logger.info("Query Hub Status")
+        sender = message.get("sender", {})
         try:
             connection_info = self.manager.get_connection_info()
 
@@ -27,15 +27,15 @@ class StatusHandler(BaseMessageHandler):
                         "human_info": connection_info.human_info,
                     },
                 },
-                target=message.get("sender", {}),
+                target=sender,
             )
 
-            await websocket.send_text(json.dumps(response))
+            await self._send(websocket, response)
             self.logger.info("Status information Done!")
 
         except Exception as e:
             self.logger.error(f"Failed to handle status request: {e}")
             error_response = self._build_hub_envelope(
-                "error", f"Failed to get status: {str(e)}", message.get("sender", {})
+                "error", f"Failed to get status: {str(e)}", sender
             )
-            await websocket.send_text(json.dumps(error_response))
+            await self._send(websocket, error_response)
@@ -1,13 +1,14 @@
 """Enhanced connection manager for WebSocket connections."""
 
-from datetime import datetime
-from typing import Dict, List, Optional, Set
-import json
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import random
 import time
-import traceback
+import orjson
 from fastapi import WebSocket
 
-from ..models import ClientInfo, ClientType, ConnectionInfo
+from ..models import ClientInfo, ClientType, ConnectionInfo, WS_TYPE_MAP
 from ..utils import (
     ClientNotFoundError,
     EnvironmentNotFoundError,
@@ -16,26 +17,91 @@ from ..utils import (
 from gameserver.utils.log import get_logger
 
 
+def _client_type(value: str) -> ClientType:
+    """Map a wire client type to ClientType, raising ValueError like the Enum."""
+    client_type = WS_TYPE_MAP.get(value)
+    if client_type is None:
+        raise ValueError(f"{value!r} is not a valid ClientType")
+    return client_type
+
+
 class ConnectionManager:
     """Enhanced manager for WebSocket connections with improved error handling and logging."""
 
-    def __init__(self):
+    # Fixed attribute layout; routing reads these on every message
+    __slots__ = (
+        "envs",
+        "agents",
+        "humans",
+        "agent_env",
+        "human_env",
+        "agent_envs",
+        "human_envs",
+        "env_agents",
+        "env_humans",
+        "connection_times",
+        "last_heartbeat_times",
+        "heartbeat_clients",
+        "heartbeat_interval",
+        "heartbeat_timeout",
+        "_heartbeat_task",
+        "_connectors",
+        "_disconnectors",
+        "_routers",
+        "logger",
+    )
+
+    def __init__(
+        self, heartbeat_interval: float = 60, heartbeat_timeout: Optional[float] = None
+    ):
         # Core data structures
         self.envs: Dict[str, WebSocket] = {}
-        self.agents: Dict[str, Dict[str, WebSocket]] = (
-            {}
-        )  # agent_id -> {env_id -> websocket}
-        self.humans: Dict[str, Dict[str, WebSocket]] = (
-            {}
-        )  # human_id -> {env_id -> websocket}
+        # (client_id, env_id) -> websocket, one probe per routed message
+        self.agents: Dict[Tuple[str, str], WebSocket] = {}
+        self.humans: Dict[Tuple[str, str], WebSocket] = {}
+
+        # Reverse index used by get_env_id: client_id -> env_id it routes to
+        self.agent_env: Dict[str, str] = {}
+        self.human_env: Dict[str, str] = {}
+        # client_id -> ordered {env_id: None}, so fallbacks never scan the flat tables
+        self.agent_envs: Dict[str, Dict[str, None]] = {}
+        self.human_envs: Dict[str, Dict[str, None]] = {}
 
         # Environment membership tracking
         self.env_agents: Dict[str, Set[str]] = {}  # env_id -> {agent_id}
         self.env_humans: Dict[str, Set[str]] = {}  # env_id -> {human_id}
 
         # Connection metadata
-        self.connection_times: Dict[str, float] = {}  # connection_key -> timestamp
-        self.last_heartbeat_times: Dict[str, float] = {}  # connection_key -> timestamp
+        # connection_key -> monotonic connect time
+        self.connection_times: Dict[str, float] = {}
+        # connection_key -> monotonic time, ordered oldest heartbeat first
+        self.last_heartbeat_times: "OrderedDict[str, float]" = OrderedDict()
+        # connection_key -> (client_type, client_id, env_id) for the stale sweep
+        self.heartbeat_clients: Dict[str, Tuple[ClientType, str, str]] = {}
+
+        # Heartbeat monitor settings (seconds); no timeout means the monitor is off
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+        # Per-type connect/disconnect dispatch
+        self._connectors = {
+            ClientType.ENV: self._connect_environment,
+            ClientType.AGENT: self._connect_agent,
+            ClientType.HUMAN: self._connect_human,
+        }
+        self._disconnectors = {
+            ClientType.ENV: self._disconnect_environment,
+            ClientType.AGENT: self._disconnect_agent,
+            ClientType.HUMAN: self._disconnect_human,
+        }
+
+        # Per-recipient-type routing dispatch
+        self._routers = {
+            ClientType.ENV: self._route_to_environment,
+            ClientType.AGENT: self._route_to_agent,
+            ClientType.HUMAN: self._route_to_human,
+        }
 
         self.logger = get_logger(__name__)
 
@@ -44,10 +110,15 @@ class ConnectionManager:
         self.envs.clear()
         self.agents.clear()
         self.humans.clear()
+        self.agent_env.clear()
+        self.human_env.clear()
+        self.agent_envs.clear()
+        self.human_envs.clear()
         self.env_agents.clear()
         self.env_humans.clear()
         self.connection_times.clear()
         self.last_heartbeat_times.clear()
+        self.heartbeat_clients.clear()
         self.logger.info("Connection manager reset")
 
     def _get_connection_key(
@@ -62,106 +133,43 @@ class ConnectionManager:
         self,
         client_type: str,
         websocket: WebSocket,
-        env_id: Optional[int] = None,
-        agent_id: Optional[int] = None,
-        human_id: Optional[int] = None,
+        env_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        human_id: Optional[str] = None,
     ) -> None:
         """Connect a client based on its type."""
-
-        async def _connect_environment(env_id: int, websocket: WebSocket) -> None:
-            """Connect an environment."""
-            if env_id is None:
-                raise ValueError("Environment ID cannot be None")
-
-            if env_id in self.envs:
-                self.logger.warning(
-                    f"Replacing existing environment connection for env_id {env_id}"
-                )
-
-            self.envs[env_id] = websocket
-
-            # Initialize client tracking for this environment
-            if env_id not in self.env_agents:
-                self.env_agents[env_id] = set()
-            if env_id not in self.env_humans:
-                self.env_humans[env_id] = set()
-
-        async def _connect_agent(
-            agent_id: int, env_id: int, websocket: WebSocket
-        ) -> None:
-            """Connect an agent to an environment."""
-            if agent_id is None or env_id is None:
-                raise ValueError("Agent ID and Environment ID cannot be None")
-
-            # Initialize agent's environment dict if needed
-            if agent_id not in self.agents:
-                self.agents[agent_id] = {}
-
-            # Check for duplicate connection
-            if env_id in self.agents[agent_id]:
-                raise DuplicateConnectionError(
-                    f"Agent {agent_id} already connected to environment {env_id}"
-                )
-
-            # Store connection
-            self.agents[agent_id][env_id] = websocket
-
-            # Add to environment tracking
-            if env_id not in self.env_agents:
-                self.env_agents[env_id] = set()
-            self.env_agents[env_id].add(agent_id)
-
-        async def _connect_human(
-            human_id: int, env_id: int, websocket: WebSocket
-        ) -> None:
-            """Connect a human to an environment."""
-            if human_id is None or env_id is None:
-                raise ValueError("Human ID and Environment ID cannot be None")
-
-            # Initialize human's environment dict if needed
-            if human_id not in self.humans:
-                self.humans[human_id] = {}
-
-            # Check for duplicate connection
-            if env_id in self.humans[human_id]:
-                raise DuplicateConnectionError(
-                    f"Human {human_id} already connected to environment {env_id}"
-                )
-
-            # Store connection
-            self.humans[human_id][env_id] = websocket
-
-            # Add to environment tracking
-            if env_id not in self.env_humans:
-                self.env_humans[env_id] = set()
-            self.env_humans[env_id].add(human_id)
-
-        client_type = ClientType(client_type)
-        connection_key = self._get_connection_key(
-            client_type, agent_id or human_id, env_id
-        )
+        client_type = _client_type(client_type)
+        client_id = agent_id or human_id or env_id
+        connection_key = self._get_connection_key(client_type, client_id, env_id)
+        connector = self._connectors.get(client_type)
 
         # Accept connection first
         await websocket.accept()
 
         try:
-            if client_type == ClientType.ENV:
-                await _connect_environment(env_id, websocket)
-            elif client_type == ClientType.AGENT:
-                await _connect_agent(agent_id, env_id, websocket)
-            elif client_type == ClientType.HUMAN:
-                await _connect_human(human_id, env_id, websocket)
-            else:
+            if connector is None:
                 raise ValueError(f"Invalid Client type: {client_type}")
-
-            # Record connection metadata
-            self.connection_times[connection_key] = datetime.now()
+            await connector(agent_id or human_id, env_id, websocket)
+
+            # Record connection metadata; the connect counts as the first heartbeat
+            now = time.monotonic()
+            self.connection_times[connection_key] = now
+            self.last_heartbeat_times[connection_key] = now
+            self.last_heartbeat_times.move_to_end(connection_key)
+            self.heartbeat_clients[connection_key] = (client_type, client_id, env_id)
+
+            # Cache identity on the socket so per-message paths skip key rebuilding
+            websocket.state.connection_key = connection_key
+            websocket.state.client_key = (client_type, client_id, env_id)
             self.logger.info(
-                f"Connected {client_type.value} (ID: {agent_id or human_id or env_id}, Env: {env_id})"
+                "Connected %s (ID: %s, Env: %s)",
+                client_type.value,
+                agent_id or human_id or env_id,
+                env_id,
             )
 
         except Exception as e:
-            self.logger.error(f"Failed to connect {client_type}: {e}")
+            self.logger.error("Failed to connect %s: %s", client_type, e)
             await websocket.close(code=1011, reason=str(e))
             raise
 
@@ -169,74 +177,166 @@ class ConnectionManager:
         self,
         client_type: str,
         websocket: WebSocket,
-        env_id: Optional[int] = None,
-        agent_id: Optional[int] = None,
-        human_id: Optional[int] = None,
+        env_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        human_id: Optional[str] = None,
     ) -> None:
         """Disconnect a client based on its type."""
+        client_type = _client_type(client_type)
+        # A socket that was replaced (or never registered) must not unregister
+        # the connection now stored under the same ids
+        current = self._get_websocket(client_type, agent_id or human_id, env_id)
+        if current is not None and current is not websocket:
+            self.logger.debug(
+                "Skipping disconnect of a stale %s socket (Env: %s)",
+                client_type.value,
+                env_id,
+            )
+            return
 
-        def _disconnect_environment(env_id: int) -> None:
-            """Disconnect an environment and clean up all related connections."""
-            if env_id not in self.envs:
-                self.logger.warning(f"Environment {env_id} not found for disconnect")
-                return
+        # Reuse the key cached on the socket at connect time when there is one
+        connection_key = getattr(websocket.state, "connection_key", None)
+        if connection_key is None:
+            connection_key = self._get_connection_key(
+                client_type, agent_id or human_id or env_id, env_id
+            )
+        disconnector = self._disconnectors.get(client_type)
 
-            # Remove environment
-            del self.envs[env_id]
+        try:
+            if disconnector is not None:
+                disconnector(agent_id or human_id, env_id)
 
-            # Clean up client tracking
-            self.env_agents.pop(env_id, None)
-            self.env_humans.pop(env_id, None)
+            self.logger.info(
+                "Disconnected %s (ID: %s, Env: %s)",
+                client_type.value,
+                agent_id or human_id or env_id,
+                env_id,
+            )
 
-        def _disconnect_agent(agent_id: int, env_id: int) -> None:
-            """Disconnect an agent from an environment."""
-            if agent_id in self.agents and env_id in self.agents[agent_id]:
-                del self.agents[agent_id][env_id]
+        except Exception as e:
+            self.logger.error("Error during disconnect: %s", e)
+        finally:
+            # Clean up metadata even if the disconnector failed, so entries never leak
+            self.connection_times.pop(connection_key, None)
+            self.last_heartbeat_times.pop(connection_key, None)
+            self.heartbeat_clients.pop(connection_key, None)
 
-                # Clean up empty agent dict
-                if not self.agents[agent_id]:
-                    del self.agents[agent_id]
+    async def _connect_environment(
+        self, client_id: Optional[str], env_id: str, websocket: WebSocket
+    ) -> None:
+        """Connect an environment (client_id is not used for environments)."""
+        if env_id is None:
+            raise ValueError("Environment ID cannot be None")
 
-            # Remove from environment tracking
-            if env_id in self.env_agents:
-                self.env_agents[env_id].discard(agent_id)
+        if env_id in self.envs:
+            self.logger.warning(
+                "Replacing existing environment connection for env_id %s", env_id
+            )
 
-        def _disconnect_human(human_id: int, env_id: int) -> None:
-            """Disconnect a human from an environment."""
-            if human_id in self.humans and env_id in self.humans[human_id]:
-                del self.humans[human_id][env_id]
+        self.envs[env_id] = websocket
 
-                # Clean up empty human dict
-                if not self.humans[human_id]:
-                    del self.humans[human_id]
+        # Initialize client tracking for this environment
+        if env_id not in self.env_agents:
+            self.env_agents[env_id] = set()
+        if env_id not in self.env_humans:
+            self.env_humans[env_id] = set()
 
-            # Remove from environment tracking
-            if env_id in self.env_humans:
-                self.env_humans[env_id].discard(human_id)
+    async def _connect_agent(
+        self, agent_id: str, env_id: str, websocket: WebSocket
+    ) -> None:
+        """Connect an agent to an environment."""
+        if agent_id is None or env_id is None:
+            raise ValueError("Agent ID and Environment ID cannot be None")
+
+        # Check for duplicate connection
+        key = (agent_id, env_id)
+        if key in self.agents:
+            raise DuplicateConnectionError(
+                f"Agent {agent_id} already connected to environment {env_id}"
+            )
 
-        client_type = ClientType(client_type)
-        connection_key = self._get_connection_key(
-            client_type, agent_id or human_id, env_id
-        )
+        # Store connection
+        self.agents[key] = websocket
+        # Keep routing to the env the agent joined first
+        self.agent_env.setdefault(agent_id, env_id)
+        self.agent_envs.setdefault(agent_id, {})[env_id] = None
 
-        try:
-            if client_type == ClientType.ENV:
-                _disconnect_environment(env_id)
-            elif client_type == ClientType.AGENT:
-                _disconnect_agent(agent_id, env_id)
-            elif client_type == ClientType.HUMAN:
-                _disconnect_human(human_id, env_id)
-
-            # Clean up metadata
-            self.connection_times.pop(connection_key, None)
-            self.last_heartbeat_times.pop(connection_key, None)
+        # Add to environment tracking
+        if env_id not in self.env_agents:
+            self.env_agents[env_id] = set()
+        self.env_agents[env_id].add(agent_id)
 
-            self.logger.info(
-                f"Disconnected {client_type.value} (ID: {agent_id or human_id or env_id}, Env: {env_id})"
+    async def _connect_human(
+        self, human_id: str, env_id: str, websocket: WebSocket
+    ) -> None:
+        """Connect a human to an environment."""
+        if human_id is None or env_id is None:
+            raise ValueError("Human ID and Environment ID cannot be None")
+
+        # Check for duplicate connection
+        key = (human_id, env_id)
+        if key in self.humans:
+            raise DuplicateConnectionError(
+                f"Human {human_id} already connected to environment {env_id}"
             )
 
-        except Exception as e:
-            self.logger.error(f"Error during disconnect: {e}")
+        # Store connection
+        self.humans[key] = websocket
+        # Keep routing to the env the human joined first
+        self.human_env.setdefault(human_id, env_id)
+        self.human_envs.setdefault(human_id, {})[env_id] = None
+
+        # Add to environment tracking
+        if env_id not in self.env_humans:
+            self.env_humans[env_id] = set()
+        self.env_humans[env_id].add(human_id)
+
+    def _disconnect_environment(self, client_id: Optional[str], env_id: str) -> None:
+        """Disconnect an environment and clean up all related connections."""
+        if env_id not in self.envs:
+            self.logger.warning("Environment %s not found for disconnect", env_id)
+            return
+
+        # Remove environment
+        del self.envs[env_id]
+
+        # Clean up client tracking
+        self.env_agents.pop(env_id, None)
+        self.env_humans.pop(env_id, None)
+
+    def _disconnect_agent(self, agent_id: str, env_id: str) -> None:
+        """Disconnect an agent from an environment."""
+        if self.agents.pop((agent_id, env_id), None) is not None:
+            remaining = self.agent_envs[agent_id]
+            del remaining[env_id]
+            if not remaining:
+                del self.agent_envs[agent_id]
+                del self.agent_env[agent_id]
+            elif self.agent_env[agent_id] == env_id:
+                # Fall back to the next env the agent is still in
+                self.agent_env[agent_id] = next(iter(remaining))
+
+        # Remove from environment tracking
+        members = self.env_agents.get(env_id)
+        if members is not None:
+            members.discard(agent_id)
+
+    def _disconnect_human(self, human_id: str, env_id: str) -> None:
+        """Disconnect a human from an environment."""
+        if self.humans.pop((human_id, env_id), None) is not None:
+            remaining = self.human_envs[human_id]
+            del remaining[env_id]
+            if not remaining:
+                del self.human_envs[human_id]
+                del self.human_env[human_id]
+            elif self.human_env[human_id] == env_id:
+                # Fall back to the next env the human is still in
+                self.human_env[human_id] = next(iter(remaining))
+
+        # Remove from environment tracking
+        members = self.env_humans.get(env_id)
+        if members is not None:
+            members.discard(human_id)
 
     async def route_message(
         self,
@@ -248,8 +348,10 @@ class ConnectionManager:
 
         try:
             # 详细的路由检测和验证
-            self.logger.info(
-                f"Starting message routing - Sender: {sender}, Recipient: {recipient}"
+            self.logger.debug(
+                "Starting message routing - Sender: %s, Recipient: %s",
+                sender,
+                recipient,
             )
 
             # 验证发送者格式
@@ -266,42 +368,35 @@ class ConnectionManager:
 
             # 尝试创建 ClientInfo 对象并捕获具体错误
             try:
-                sender_info = ClientInfo(**sender)
-                self.logger.info(f"Sender info created: {sender_info}")
+                sender_info = self._client_info(sender)
+                self.logger.debug("Sender info created: %s", sender_info)
             except Exception as e:
                 error_msg = f"Invalid sender format: {e}. Sender data: {sender}"
-                self.logger.error(f"{error_msg}\nTraceback: {traceback.format_exc()}")
+                self.logger.error(error_msg, exc_info=True)
                 raise ValueError(error_msg)
 
             try:
-                recipient_info = ClientInfo(**recipient)
-                self.logger.info(f"Recipient info created: {recipient_info}")
+                recipient_info = self._client_info(recipient)
+                self.logger.debug("Recipient info created: %s", recipient_info)
             except Exception as e:
                 error_msg = (
                     f"Invalid recipient format: {e}. Recipient data: {recipient}"
                 )
-                self.logger.error(f"{error_msg}\nTraceback: {traceback.format_exc()}")
+                self.logger.error(error_msg, exc_info=True)
                 raise ValueError(error_msg)
 
-            # 路由到环境
-            if recipient_info.type == ClientType.ENV:
-                return await self._route_to_environment(recipient_info, message)
-
-            # 路由到代理
-            elif recipient_info.type == ClientType.AGENT:
-                return await self._route_to_agent(sender_info, recipient_info, message)
+            # 只序列化一次，抄送等多次发送复用同一份二进制帧
+            payload = orjson.dumps(message)
 
-            # 路由到人类
-            elif recipient_info.type == ClientType.HUMAN:
-                return await self._route_to_human(sender_info, recipient_info, message)
-
-            else:
+            # 按接收者类型路由到环境、代理或人类
+            router = self._routers.get(recipient_info.type)
+            if router is None:
                 raise ValueError(f"Invalid recipient type: {recipient_info.type}")
+            return await router(sender_info, recipient_info, payload)
 
         except Exception as e:
             error_details = {
                 "error": str(e),
-                "traceback": traceback.format_exc(),
                 "sender": sender,
                 "recipient": recipient,
                 "message_type": (
@@ -310,142 +405,168 @@ class ConnectionManager:
                     else "invalid"
                 ),
             }
-            self.logger.error(f"Failed to route message: {error_details}")
+            self.logger.error("Failed to route message: %s", error_details)
+            self.logger.debug("Route message traceback", exc_info=True)
             return False
 
+    @staticmethod
+    def _client_info(client: dict) -> ClientInfo:
+        """Build a ClientInfo from an endpoint-validated dict without a Pydantic pass."""
+        client_id = client.get("id")
+        # model_construct skips validation, so keep rejecting non-string ids
+        if client_id is not None and not isinstance(client_id, str):
+            raise ValueError(
+                f"id must be a string, got {type(client_id).__name__}: {client_id!r}"
+            )
+        return ClientInfo.model_construct(
+            type=_client_type(client["type"]), id=client_id
+        )
+
     async def _route_to_environment(
-        self, recipient_info: ClientInfo, message: dict
+        self, sender_info: ClientInfo, recipient_info: ClientInfo, payload: bytes
     ) -> bool:
         """Route message to environment."""
-        self.logger.info(f"Routing message to environment {recipient_info.id}")
+        self.logger.debug("Routing message to environment %s", recipient_info.id)
 
         if recipient_info.id is None:
             raise ValueError("Environment ID required for environment messages")
 
-        if recipient_info.id not in self.envs:
+        websocket = self.envs.get(recipient_info.id)
+        if websocket is None:
             available_envs = list(self.envs.keys())
             raise ClientNotFoundError(
                 f"Environment {recipient_info.id} not found. Available environments: {available_envs}"
             )
 
         try:
-            await self.envs[recipient_info.id].send_text(json.dumps(message))
-            self.logger.info(
-                f"Message successfully sent to environment {recipient_info.id}"
+            await websocket.send_bytes(payload)
+            self.logger.debug(
+                "Message successfully sent to environment %s", recipient_info.id
             )
             return True
         except Exception as e:
             self.logger.error(
-                f"Failed to send message to environment {recipient_info.id}: {e}"
+                "Failed to send message to environment %s: %s", recipient_info.id, e
             )
             return False
 
     async def _route_to_agent(
-        self, sender_info: ClientInfo, recipient_info: ClientInfo, message: dict
+        self, sender_info: ClientInfo, recipient_info: ClientInfo, payload: bytes
     ) -> bool:
         """Route message to agent."""
         # 获取接收者的环境ID
         recipient_env_id = self.get_env_id(recipient_info)
 
-        self.logger.info(
-            f"Routing message to agent {recipient_info.id} in environment {recipient_env_id}"
+        self.logger.debug(
+            "Routing message to agent %s in environment %s",
+            recipient_info.id,
+            recipient_env_id,
         )
 
         if recipient_info.id is None:
             raise ValueError("Agent ID required for agent messages")
 
         if recipient_env_id is None:
-            available_agents = {
-                aid: list(envs.keys()) for aid, envs in self.agents.items()
-            }
+            available_agents = self._group_by_client(self.agent_envs)
             raise ClientNotFoundError(
                 f"Could not determine environment for agent {recipient_info.id}. Available agents: {available_agents}"
             )
 
-        if recipient_info.id not in self.agents:
-            available_agents = list(self.agents.keys())
-            raise ClientNotFoundError(
-                f"Agent {recipient_info.id} not found. Available agents: {available_agents}"
-            )
-
-        if recipient_env_id not in self.agents[recipient_info.id]:
-            available_envs = list(self.agents[recipient_info.id].keys())
+        websocket = self.agents.get((recipient_info.id, recipient_env_id))
+        if websocket is None:
+            available_envs = list(self.agent_envs.get(recipient_info.id, ()))
             raise ClientNotFoundError(
                 f"Agent {recipient_info.id} not found in environment {recipient_env_id}. Agent is in environments: {available_envs}"
             )
 
-        try:
-            # 发送消息给代理
-            await self.agents[recipient_info.id][recipient_env_id].send_text(
-                json.dumps(message)
-            )
-            self.logger.info(
-                f"Message successfully sent to agent {recipient_info.id} in env {recipient_env_id}"
-            )
-
-            # 如果是代理到代理的消息，抄送给环境
-            if sender_info.type == ClientType.AGENT:
-                if recipient_env_id in self.envs:
-                    await self.envs[recipient_env_id].send_text(json.dumps(message))
-                    self.logger.info(
-                        f"Message carbon copy sent to environment {recipient_env_id}"
-                    )
-                else:
-                    self.logger.warning(
-                        f"Environment {recipient_env_id} not found for carbon copy"
-                    )
+        # 如果是代理到代理的消息，抄送给环境
+        env_websocket = None
+        if sender_info.type == ClientType.AGENT:
+            env_websocket = self.envs.get(recipient_env_id)
+            if env_websocket is None:
+                self.logger.warning(
+                    "Environment %s not found for carbon copy", recipient_env_id
+                )
 
-            return True
-        except Exception as e:
-            self.logger.error(
-                f"Failed to send message to agent {recipient_info.id}: {e}"
+        if env_websocket is None:
+            try:
+                await websocket.send_bytes(payload)
+            except Exception as e:
+                self.logger.error(
+                    "Failed to send message to agent %s: %s", recipient_info.id, e
+                )
+                return False
+        else:
+            # 代理和抄送并发发送，一端拥塞不会阻塞另一端
+            agent_result, cc_result = await asyncio.gather(
+                websocket.send_bytes(payload),
+                env_websocket.send_bytes(payload),
+                return_exceptions=True,
             )
-            return False
+            if isinstance(cc_result, Exception):
+                self.logger.error(
+                    "Failed to send carbon copy to environment %s: %s",
+                    recipient_env_id,
+                    cc_result,
+                )
+            else:
+                self.logger.debug(
+                    "Message carbon copy sent to environment %s", recipient_env_id
+                )
+            if isinstance(agent_result, Exception):
+                self.logger.error(
+                    "Failed to send message to agent %s: %s",
+                    recipient_info.id,
+                    agent_result,
+                )
+                return False
+
+        self.logger.debug(
+            "Message successfully sent to agent %s in env %s",
+            recipient_info.id,
+            recipient_env_id,
+        )
+        return True
 
     async def _route_to_human(
-        self, sender_info: ClientInfo, recipient_info: ClientInfo, message: dict
+        self, sender_info: ClientInfo, recipient_info: ClientInfo, payload: bytes
     ) -> bool:
         """Route message to human."""
         recipient_env_id = self.get_env_id(recipient_info)
 
-        self.logger.info(
-            f"Routing message to human {recipient_info.id} in environment {recipient_env_id}"
+        self.logger.debug(
+            "Routing message to human %s in environment %s",
+            recipient_info.id,
+            recipient_env_id,
         )
 
         if recipient_info.id is None:
             raise ValueError("Human ID required for human messages")
 
         if recipient_env_id is None:
-            available_humans = {
-                hid: list(envs.keys()) for hid, envs in self.humans.items()
-            }
+            available_humans = self._group_by_client(self.human_envs)
             raise ClientNotFoundError(
                 f"Could not determine environment for human {recipient_info.id}. Available humans: {available_humans}"
             )
 
-        if recipient_info.id not in self.humans:
-            available_humans = list(self.humans.keys())
-            raise ClientNotFoundError(
-                f"Human {recipient_info.id} not found. Available humans: {available_humans}"
-            )
-
-        if recipient_env_id not in self.humans[recipient_info.id]:
-            available_envs = list(self.humans[recipient_info.id].keys())
+        websocket = self.humans.get((recipient_info.id, recipient_env_id))
+        if websocket is None:
+            available_envs = list(self.human_envs.get(recipient_info.id, ()))
             raise ClientNotFoundError(
                 f"Human {recipient_info.id} not found in environment {recipient_env_id}. Human is in environments: {available_envs}"
             )
 
         try:
-            await self.humans[recipient_info.id][recipient_env_id].send_text(
-                json.dumps(message)
-            )
-            self.logger.info(
-                f"Message successfully sent to human {recipient_info.id} in env {recipient_env_id}"
+            await websocket.send_bytes(payload)
+            self.logger.debug(
+                "Message successfully sent to human %s in env %s",
+                recipient_info.id,
+                recipient_env_id,
             )
             return True
         except Exception as e:
             self.logger.error(
-                f"Failed to send message to human {recipient_info.id}: {e}"
+                "Failed to send message to human %s: %s", recipient_info.id, e
             )
             return False
 
@@ -453,36 +574,132 @@ class ConnectionManager:
         """Get comprehensive connection information."""
         return ConnectionInfo(
             environments=list(self.envs.keys()),
-            agents={
-                agent_id: list(envs.keys()) for agent_id, envs in self.agents.items()
-            },
-            humans={
-                human_id: list(envs.keys()) for human_id, envs in self.humans.items()
-            },
+            agents=self._group_by_client(self.agent_envs),
+            humans=self._group_by_client(self.human_envs),
         )
 
-    def update_heartbeat_time(self, client_info: dict) -> None:
-        """Update the last heartbeat time for a client."""
-        client_info = ClientInfo(**client_info)
-        connection_key = self._get_connection_key(
-            client_info.type, client_info.id, self.get_env_id(client_info)
+    @staticmethod
+    def _group_by_client(
+        client_envs: Dict[str, Dict[str, None]],
+    ) -> Dict[str, List[str]]:
+        """Build the client_id -> [env_id] view of a per-client env index."""
+        return {client_id: list(envs) for client_id, envs in client_envs.items()}
+
+    def update_heartbeat_time(self, websocket: WebSocket) -> None:
+        """Update the last heartbeat time for the client owning this websocket."""
+        connection_key = websocket.state.connection_key
+        # A heartbeat racing a disconnect or the stale sweep must not re-create the entry
+        if connection_key not in self.connection_times:
+            return
+        self.last_heartbeat_times[connection_key] = time.monotonic()
+        # Keep the dict ordered by last heartbeat so the sweep only visits stale entries
+        self.last_heartbeat_times.move_to_end(connection_key)
+        self.heartbeat_clients[connection_key] = websocket.state.client_key
+
+    def start_heartbeat_monitor(self) -> None:
+        """Start the stale-connection monitor if a heartbeat timeout is configured.
+
+        Call from the application lifespan; pair with stop_heartbeat_monitor.
+        """
+        if self.heartbeat_timeout is None:
+            return
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_monitor())
+
+    async def stop_heartbeat_monitor(self) -> None:
+        """Cancel the stale-connection monitor and wait for it to finish."""
+        task, self._heartbeat_task = self._heartbeat_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _heartbeat_monitor(self) -> None:
+        """Periodically disconnect clients that stopped sending heartbeats."""
+        while True:
+            # Jitter the sweep so it does not lock step with other periodic work
+            jitter = self.heartbeat_interval * 0.1
+            await asyncio.sleep(
+                self.heartbeat_interval + random.uniform(-jitter, jitter)
+            )
+            try:
+                await self._check_stale_connections()
+            except Exception as e:
+                self.logger.error("Heartbeat check failed: %s", e)
+
+    async def _check_stale_connections(self) -> int:
+        """Disconnect clients whose last heartbeat is older than heartbeat_timeout.
+
+        Entries are ordered oldest first, so the sweep stops at the first fresh one.
+        """
+        deadline = time.monotonic() - self.heartbeat_timeout
+        stale = []
+        while self.last_heartbeat_times:
+            connection_key, last_seen = next(iter(self.last_heartbeat_times.items()))
+            if last_seen > deadline:
+                break
+            self.last_heartbeat_times.popitem(last=False)
+            client = self.heartbeat_clients.pop(connection_key, None)
+            if client is not None:
+                stale.append(client)
+
+        expired = []
+        for client_type, client_id, env_id in stale:
+            websocket = self._get_websocket(client_type, client_id, env_id)
+            self.logger.warning(
+                "Heartbeat timeout for %s %s (Env: %s)",
+                client_type.value,
+                client_id,
+                env_id,
+            )
+            if websocket is not None:
+                expired.append((websocket, client_type, client_id, env_id))
+
+        # Close all expired sockets concurrently, then drop them from the tables
+        await asyncio.gather(
+            *(
+                websocket.close(code=1001, reason="Heartbeat timeout")
+                for websocket, *_ in expired
+            ),
+            return_exceptions=True,
         )
-        self.last_heartbeat_times[connection_key] = datetime.now()
+        for websocket, client_type, client_id, env_id in expired:
+            # The closes above yielded; skip ids that were reconnected meanwhile
+            if self._get_websocket(client_type, client_id, env_id) is not websocket:
+                continue
+            await self.disconnect(
+                client_type.value,
+                websocket,
+                env_id=env_id,
+                agent_id=client_id if client_type == ClientType.AGENT else None,
+                human_id=client_id if client_type == ClientType.HUMAN else None,
+            )
+
+        return len(stale)
+
+    def _get_websocket(
+        self, client_type: ClientType, client_id: str, env_id: Optional[str]
+    ) -> Optional[WebSocket]:
+        """Look up the websocket of a connected client."""
+        if client_type == ClientType.ENV:
+            return self.envs.get(env_id)
+        if client_type == ClientType.AGENT:
+            return self.agents.get((client_id, env_id))
+        if client_type == ClientType.HUMAN:
+            return self.humans.get((client_id, env_id))
+        return None
 
     def is_client_connected(self, client_info) -> bool:
         """Check if a client is currently connected."""
         if client_info.type == ClientType.ENV:
             return self.get_env_id(client_info) in self.envs
         elif client_info.type == ClientType.AGENT:
-            return (
-                client_info.id in self.agents
-                and self.get_env_id(client_info) in self.agents[client_info.id]
-            )
+            return client_info.id in self.agent_env
         elif client_info.type == ClientType.HUMAN:
-            return (
-                client_info.id in self.humans
-                and self.get_env_id(client_info) in self.humans[client_info.id]
-            )
+            return client_info.id in self.human_env
         return False
 
     def get_env_id(self, client_info) -> Optional[str]:
@@ -493,9 +710,7 @@ class ConnectionManager:
         if client_type == ClientType.ENV:
             return client_id
         elif client_type == ClientType.AGENT:
-            if client_id in self.agents:
-                return next(iter(self.agents[client_id]), None)
+            return self.agent_env.get(client_id)
         elif client_type == ClientType.HUMAN:
-            if client_id in self.humans:
-                return next(iter(self.humans[client_id]), None)
+            return self.human_env.get(client_id)
         return None
@@ -1,8 +1,10 @@
 """Refactored WebSocket endpoints for the star server."""
 
-import json
-import traceback
-from typing import Dict, Optional, Callable
+import asyncio
+import os
+from typing import Dict, Optional, Callable, Union
+
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
 from .models import Envelope, ClientInfo, ClientType, MessageType
 from .manager.connection_manager import ConnectionManager
@@ -14,12 +16,42 @@ from .handlers import (
 from .utils import ValidationError
 from gameserver.utils.log import get_logger
 
+# Yield to the event loop every N frames so one busy client cannot starve others
+_YIELD_EVERY = 32
+
+# Valid sender/recipient types, checked on every incoming message
+_CLIENT_TYPES = frozenset(t.value for t in ClientType)
+
+
+def _heartbeat_timeout() -> Optional[float]:
+    """Read the heartbeat timeout in seconds from GAMESERVER_HEARTBEAT_TIMEOUT.
+
+    Unset or empty disables the stale-connection sweep; anything else must be
+    a positive number, since a zero or negative timeout would expire every client.
+    """
+    raw = os.environ.get("GAMESERVER_HEARTBEAT_TIMEOUT")
+    if not raw:
+        return None
+    try:
+        timeout = float(raw)
+    except ValueError:
+        raise ValueError(
+            f"GAMESERVER_HEARTBEAT_TIMEOUT must be a number of seconds, got {raw!r}"
+        ) from None
+    # Written as "not > 0" so NaN is rejected too
+    if not timeout > 0:
+        raise ValueError(
+            f"GAMESERVER_HEARTBEAT_TIMEOUT must be greater than 0, got {raw!r}"
+        )
+    return timeout
+
 
 class MetaverseWebSocketServer:
     """Enhanced WebSocket server for metaverse communication."""
 
     def __init__(self):
-        self.manager = ConnectionManager()
+        # Opt-in: clients silent for this many seconds are disconnected
+        self.manager = ConnectionManager(heartbeat_timeout=_heartbeat_timeout())
         self.logger = get_logger(__name__)
         self.router = APIRouter()
 
@@ -136,11 +168,15 @@ class MetaverseWebSocketServer:
             ),
         )
 
-        await websocket.send_text(confirmation.model_dump_json())
+        await self._send_envelope(websocket, confirmation)
         self.logger.info(
             f"Connection confirmed for {client_type}, ID: {agent_id or human_id or env_id}"
         )
 
+    async def _send_envelope(self, websocket: WebSocket, envelope: Envelope) -> None:
+        """Encode an envelope with orjson and send it as a binary frame."""
+        await websocket.send_bytes(orjson.dumps(envelope.model_dump()))
+
     async def _message_processing_loop(
         self,
         websocket: WebSocket,
@@ -148,10 +184,20 @@ class MetaverseWebSocketServer:
     ) -> None:
         """Main message processing loop."""
 
+        processed = 0
         while True:
+            data = b""
+            processed += 1
+            if processed % _YIELD_EVERY == 0:
+                await asyncio.sleep(0)
             try:
-                # Receive message
-                data = await websocket.receive_text()
+                # Receive message (text or binary frame) without forcing a str decode
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(
+                        frame.get("code", 1000), frame.get("reason")
+                    )
+                data = frame.get("bytes") or frame.get("text") or b""
                 message = await self._check_message_format(data)
 
                 if message:
@@ -162,34 +208,25 @@ class MetaverseWebSocketServer:
                 raise
             except ValidationError as e:
                 await self._validation_error(websocket, client_info, str(e))
-            except json.JSONDecodeError:
-                await self._json_error(websocket, client_info, data)
             except Exception as e:
-                # 捕获所有其他异常，提供详细的调试信息
-                error_details = {
-                    "error": str(e),
-                    "traceback": traceback.format_exc(),
-                    "raw_data": (
-                        data[:500] if len(data) > 500 else data
-                    ),  # 限制数据长度避免日志过长
-                }
-                self.logger.error(
-                    f"Unexpected error in message processing loop: {error_details}"
-                )
-                await self._processing_error(
-                    websocket, client_info, str(e), traceback.format_exc()
+                self.logger.error("Unexpected error in message processing loop: %s", e)
+                # The stack is only formatted when DEBUG is enabled
+                self.logger.debug(
+                    "Message processing traceback, raw data: %r",
+                    data[:500],
+                    exc_info=True,
                 )
+                await self._processing_error(websocket, client_info, str(e))
 
     async def _check_message_format(
         self,
-        data: str,
+        data: Union[str, bytes],
     ) -> Optional[Dict]:
         """Parse and validate incoming message."""
 
         try:
-            message = json.loads(data)
-            print(f"message({type(message)}): {message}")
-        except json.JSONDecodeError:
+            message = orjson.loads(data)
+        except orjson.JSONDecodeError:
             raise ValidationError("Invalid JSON format")
 
         # Validate required fields
@@ -215,10 +252,8 @@ class MetaverseWebSocketServer:
                     )
 
                 # 验证 type 是否为有效的 ClientType
-                try:
-                    client_type = field_value.get("type")
-                    ClientType(client_type)  # 验证是否为有效的 ClientType
-                except ValueError:
+                client_type = field_value.get("type")
+                if client_type not in _CLIENT_TYPES:
                     raise ValidationError(
                         f"Message '{field}' has invalid type '{client_type}'. Valid types: {[t.value for t in ClientType]}"
                     )
@@ -245,19 +280,12 @@ class MetaverseWebSocketServer:
             else:
                 await self._unknown_type_error(websocket, msg_type, message)
         except Exception as e:
-            # 捕获处理器中的所有异常，提供详细的错误信息
-            error_details = {
-                "error": str(e),
-                "traceback": traceback.format_exc(),
-                "message_type": msg_type,
-                "message_data": message,
-            }
-            self.logger.error(f"Error in message handler: {error_details}")
-
-            # 向客户端发送详细错误信息
-            await self._handler_error(
-                websocket, message, str(e), traceback.format_exc()
-            )
+            self.logger.error("Error in %s message handler: %s", msg_type, e)
+            # The stack is only formatted when DEBUG is enabled
+            self.logger.debug("Message handler traceback", exc_info=True)
+
+            # 向客户端发送错误信息（不含调用栈）
+            await self._handler_error(websocket, message, str(e))
 
     async def _validation_error(
         self, websocket: WebSocket, client_info: ClientInfo, error_message: str
@@ -271,43 +299,19 @@ class MetaverseWebSocketServer:
             recipient=client_info,
         )
 
-        await websocket.send_text(error_response.model_dump_json())
-
-    async def _json_error(
-        self, websocket: WebSocket, client_info: ClientInfo, invalid_data: str
-    ) -> None:
-        """Send JSON parsing error response."""
-
-        self.logger.error(f"Invalid JSON received: {invalid_data[:100]}...")
-
-        error_response = Envelope(
-            type=MessageType.ERROR.value,
-            payload="Invalid JSON format",
-            sender=ClientInfo(type=ClientType.HUB),
-            recipient=client_info,
-        )
-
-        await websocket.send_text(error_response.model_dump_json())
+        await self._send_envelope(websocket, error_response)
 
     async def _processing_error(
         self,
         websocket: WebSocket,
         client_info: ClientInfo,
         error_message: str,
-        traceback_info: str = None,
     ) -> None:
         """Send general processing error response."""
 
         self.logger.error(f"Error processing message: {error_message}")
-        if traceback_info:
-            self.logger.error(f"Traceback: {traceback_info}")
 
-        error_payload = {
-            "error": f"Server error: {error_message}",
-            "debug_info": (
-                traceback_info if traceback_info else "No traceback available"
-            ),
-        }
+        error_payload = {"error": f"Server error: {error_message}"}
 
         error_response = Envelope(
             type=MessageType.ERROR.value,
@@ -316,14 +320,13 @@ class MetaverseWebSocketServer:
             recipient=client_info,
         )
 
-        await websocket.send_text(error_response.model_dump_json())
+        await self._send_envelope(websocket, error_response)
 
     async def _handler_error(
         self,
         websocket: WebSocket,
         original_message: Dict,
         error_message: str,
-        traceback_info: str,
     ) -> None:
         """Send handler-specific error response."""
 
@@ -342,7 +345,6 @@ class MetaverseWebSocketServer:
 
         error_payload = {
             "error": f"Message handler error: {error_message}",
-            "debug_info": traceback_info,
             "original_message_type": original_message.get("type", "unknown"),
         }
 
@@ -353,7 +355,7 @@ class MetaverseWebSocketServer:
             recipient=client_info,
         )
 
-        await websocket.send_text(error_response.model_dump_json())
+        await self._send_envelope(websocket, error_response)
 
     async def _unknown_type_error(
         self, websocket: WebSocket, msg_type: str, message: Dict
@@ -369,7 +371,7 @@ class MetaverseWebSocketServer:
             recipient=message.get("sender", {}),
         )
 
-        await websocket.send_text(error_response.model_dump_json())
+        await self._send_envelope(websocket, error_response)
 
 
 # Create server instance and export router
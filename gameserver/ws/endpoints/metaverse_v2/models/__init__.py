@@ -1,12 +1,21 @@
 """Message models for WebSocket communication."""
 
-from .message import MessageType, ClientType, Envelope, ClientInfo
+from .message import (
+    MessageType,
+    ClientType,
+    Envelope,
+    ClientInfo,
+    HUB_SENDER,
+    WS_TYPE_MAP,
+)
 from .connection import ConnectionInfo
 
 __all__ = [
     "Envelope",
     "ClientInfo",
+    "HUB_SENDER",
     "MessageType",
     "ClientType",
+    "WS_TYPE_MAP",
     "ConnectionInfo",
 ]
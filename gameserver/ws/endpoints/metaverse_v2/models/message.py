@@ -16,6 +16,10 @@ class ClientType(str, Enum):
     HUB = "hub"
 
 
+# Wire value -> ClientType, a plain dict probe instead of Enum.__call__
+WS_TYPE_MAP = {client_type.value: client_type for client_type in ClientType}
+
+
 class MessageType(str, Enum):
     """Message type enumeration."""
 
@@ -43,6 +47,10 @@ class ClientInfo(BaseModel):
     id: Optional[str] = None
 
 
+# Sender info stamped on every hub-originated frame; shared, do not mutate
+HUB_SENDER = ClientInfo(type=ClientType.HUB).model_dump(mode="json")
+
+
 class Envelope(BaseModel):
     """Envelope model"""
 
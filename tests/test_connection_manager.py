@@ -0,0 +1,225 @@
+"""Tests for the metaverse_v2 connection manager."""
+
+import time
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from gameserver.ws.endpoints.metaverse_v2.manager.connection_manager import (
+    ConnectionManager,
+)
+from gameserver.ws.endpoints.metaverse_v2.mataverse import _heartbeat_timeout
+from gameserver.ws.endpoints.metaverse_v2.models import ClientType
+
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+        self.state = SimpleNamespace()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=None):
+        self.closed = (code, reason)
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_order_follows_last_update():
+    """The most recently seen client moves to the end of the heartbeat queue."""
+    manager = ConnectionManager()
+    env_ws, agent_ws = FakeWebSocket(), FakeWebSocket()
+    await manager.connect("env", env_ws, env_id="e1")
+    await manager.connect("agent", agent_ws, env_id="e1", agent_id="a1")
+
+    manager.update_heartbeat_time(agent_ws)
+    manager.update_heartbeat_time(env_ws)
+    assert list(manager.last_heartbeat_times) == ["agent:a1:e1", "env:e1"]
+
+    manager.update_heartbeat_time(agent_ws)
+    assert list(manager.last_heartbeat_times) == ["env:e1", "agent:a1:e1"]
+
+
+@pytest.mark.asyncio
+async def test_stale_connections_are_disconnected():
+    """Clients past the heartbeat timeout are closed; fresh ones are kept."""
+    manager = ConnectionManager(heartbeat_timeout=30)
+    env_ws, stale_ws, fresh_ws = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect("env", env_ws, env_id="e1")
+    await manager.connect("agent", stale_ws, env_id="e1", agent_id="a1")
+    await manager.connect("agent", fresh_ws, env_id="e1", agent_id="a2")
+
+    manager.update_heartbeat_time(stale_ws)
+    manager.update_heartbeat_time(fresh_ws)
+    # Age the oldest entry; the queue stays ordered oldest first
+    manager.last_heartbeat_times["agent:a1:e1"] = time.monotonic() - 60
+    manager.last_heartbeat_times.move_to_end("agent:a1:e1", last=False)
+
+    assert await manager._check_stale_connections() == 1
+    assert stale_ws.closed == (1001, "Heartbeat timeout")
+    assert fresh_ws.closed is None
+    assert ("a1", "e1") not in manager.agents
+    assert ("a2", "e1") in manager.agents
+    assert list(manager.last_heartbeat_times) == ["env:e1", "agent:a2:e1"]
+
+
+@pytest.mark.asyncio
+async def test_silent_clients_expire_from_connect_time():
+    """A client that never sends a heartbeat is still swept after the timeout."""
+    manager = ConnectionManager(heartbeat_timeout=30)
+    agent_ws = FakeWebSocket()
+    await manager.connect("agent", agent_ws, env_id="e1", agent_id="a1")
+    assert list(manager.last_heartbeat_times) == ["agent:a1:e1"]
+
+    manager.last_heartbeat_times["agent:a1:e1"] = time.monotonic() - 60
+    assert await manager._check_stale_connections() == 1
+    assert agent_ws.closed == (1001, "Heartbeat timeout")
+    assert not manager.agents
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_monitor_is_opt_in_and_owned():
+    """The monitor only runs with a timeout and is cancelled by stop."""
+    disabled = ConnectionManager()
+    disabled.start_heartbeat_monitor()
+    assert disabled._heartbeat_task is None
+
+    manager = ConnectionManager(heartbeat_timeout=30)
+    manager.start_heartbeat_monitor()
+    task = manager._heartbeat_task
+    assert task is not None and not task.done()
+
+    await manager.stop_heartbeat_monitor()
+    assert task.cancelled()
+    assert manager._heartbeat_task is None
+
+
+@pytest.mark.asyncio
+async def test_disconnect_clears_heartbeat_entry():
+    """Disconnecting removes the client from the heartbeat queue."""
+    manager = ConnectionManager()
+    env_ws = FakeWebSocket()
+    await manager.connect("env", env_ws, env_id="e1")
+    manager.update_heartbeat_time(env_ws)
+
+    await manager.disconnect("env", env_ws, env_id="e1")
+    assert not manager.last_heartbeat_times
+    assert not manager.heartbeat_clients
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_after_disconnect_is_ignored():
+    """A late heartbeat does not bring a disconnected client back into the queue."""
+    manager = ConnectionManager(heartbeat_timeout=30)
+    agent_ws = FakeWebSocket()
+    await manager.connect("agent", agent_ws, env_id="e1", agent_id="a1")
+    await manager.disconnect("agent", agent_ws, env_id="e1", agent_id="a1")
+
+    manager.update_heartbeat_time(agent_ws)
+    assert not manager.last_heartbeat_times
+    assert not manager.heartbeat_clients
+    assert await manager._check_stale_connections() == 0
+    assert agent_ws.closed is None
+
+
+@pytest.mark.asyncio
+async def test_agent_message_survives_failed_carbon_copy():
+    """A failing env carbon copy does not fail delivery to the agent."""
+
+    class BrokenWebSocket(FakeWebSocket):
+        async def send_bytes(self, data):
+            raise RuntimeError("env socket closed")
+
+    manager = ConnectionManager()
+    env_ws, sender_ws, recipient_ws = (
+        BrokenWebSocket(),
+        FakeWebSocket(),
+        FakeWebSocket(),
+    )
+    await manager.connect("env", env_ws, env_id="e1")
+    await manager.connect("agent", sender_ws, env_id="e1", agent_id="a1")
+    await manager.connect("agent", recipient_ws, env_id="e1", agent_id="a2")
+
+    message = {"type": "message", "payload": "hi"}
+    assert await manager.route_message(
+        {"type": "agent", "id": "a1"}, {"type": "agent", "id": "a2"}, message
+    )
+    assert recipient_ws.sent == [orjson.dumps(message)]
+
+
+@pytest.mark.asyncio
+async def test_env_id_falls_back_when_first_env_leaves():
+    """An agent in several envs routes to the first one it joined that is still open."""
+    manager = ConnectionManager()
+    first_ws, second_ws = FakeWebSocket(), FakeWebSocket()
+    await manager.connect("agent", first_ws, env_id="e1", agent_id="a1")
+    await manager.connect("agent", second_ws, env_id="e2", agent_id="a1")
+    agent = SimpleNamespace(type=ClientType.AGENT, id="a1")
+    assert manager.get_env_id(agent) == "e1"
+
+    await manager.disconnect("agent", first_ws, env_id="e1", agent_id="a1")
+    assert manager.get_env_id(agent) == "e2"
+
+    await manager.disconnect("agent", second_ws, env_id="e2", agent_id="a1")
+    assert manager.get_env_id(agent) is None
+    assert not manager.is_client_connected(agent)
+    assert not manager.agent_envs
+
+
+@pytest.mark.asyncio
+async def test_stale_sweep_keeps_a_reconnected_client():
+    """A reconnect that lands while the sweep closes sockets is not unregistered."""
+    manager = ConnectionManager(heartbeat_timeout=30)
+    fresh_ws = FakeWebSocket()
+
+    class ReconnectingWebSocket(FakeWebSocket):
+        async def close(self, code=1000, reason=None):
+            await super().close(code, reason)
+            # The endpoint cleans up the old socket and the client comes back
+            await manager.disconnect("agent", self, env_id="e1", agent_id="a1")
+            await manager.connect("agent", fresh_ws, env_id="e1", agent_id="a1")
+
+    stale_ws = ReconnectingWebSocket()
+    await manager.connect("agent", stale_ws, env_id="e1", agent_id="a1")
+    manager.last_heartbeat_times["agent:a1:e1"] = time.monotonic() - 60
+
+    assert await manager._check_stale_connections() == 1
+    assert manager.agents[("a1", "e1")] is fresh_ws
+    assert "agent:a1:e1" in manager.last_heartbeat_times
+
+    # A late cleanup for the old socket leaves the new connection alone too
+    await manager.disconnect("agent", stale_ws, env_id="e1", agent_id="a1")
+    assert manager.agents[("a1", "e1")] is fresh_ws
+
+
+def test_client_info_rejects_non_string_ids():
+    """Non-string ids fail as an invalid format instead of a missing client."""
+    with pytest.raises(ValueError, match="id must be a string"):
+        ConnectionManager._client_info({"type": "agent", "id": 2})
+
+    info = ConnectionManager._client_info({"type": "agent", "id": "a1"})
+    assert (info.type, info.id) == (ClientType.AGENT, "a1")
+
+
+def test_heartbeat_timeout_env_is_validated(monkeypatch):
+    """The timeout is opt-in and must be a positive number of seconds."""
+    monkeypatch.delenv("GAMESERVER_HEARTBEAT_TIMEOUT", raising=False)
+    assert _heartbeat_timeout() is None
+
+    monkeypatch.setenv("GAMESERVER_HEARTBEAT_TIMEOUT", "45")
+    assert _heartbeat_timeout() == 45.0
+
+    for bad in ("soon", "0", "-5", "nan"):
+        monkeypatch.setenv("GAMESERVER_HEARTBEAT_TIMEOUT", bad)
+        with pytest.raises(ValueError, match="GAMESERVER_HEARTBEAT_TIMEOUT"):
+            _heartbeat_timeout()
@@ -0,0 +1,130 @@
+"""Tests for the v1 metaverse connection manager."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from gameserver.ws.endpoints.metaverse.core.connection_manager import (
+    ConnectionManager,
+)
+from gameserver.ws.endpoints.metaverse.models import ClientType
+from gameserver.ws.endpoints.metaverse.utils import DuplicateConnectionError
+
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket."""
+
+    def __init__(self, fail=False, delay=0):
+        self.sent = []
+        self.closed = None
+        self.fail = fail
+        self.delay = delay
+        self.state = SimpleNamespace()
+
+    async def accept(self):
+        pass
+
+    async def send_bytes(self, data):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("socket broken")
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=None):
+        self.closed = (code, reason)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_closes_and_drops_failed_clients():
+    """A recipient whose send fails is closed and removed; others still get the frame."""
+    manager = ConnectionManager()
+    ok_ws, broken_ws = FakeWebSocket(), FakeWebSocket(fail=True)
+    await manager.connect("agent", ok_ws, env_id=1, agent_id=10)
+    await manager.connect("human", broken_ws, env_id=1, human_id=20)
+
+    assert await manager.broadcast_to_env_clients(1, {"x": 1}) == 1
+    assert ok_ws.sent and ok_ws.closed is None
+    assert broken_ws.closed is not None
+    assert (20, 1) not in manager.conns[ClientType.HUMAN]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_sweep_keeps_a_reconnected_client():
+    """A client that reconnects while the batch is in flight keeps its new socket."""
+    manager = ConnectionManager()
+    fresh_ws = FakeWebSocket()
+
+    class ReconnectingWebSocket(FakeWebSocket):
+        async def send_bytes(self, data):
+            await manager.disconnect("agent", self, env_id=1, agent_id=10)
+            await manager.connect("agent", fresh_ws, env_id=1, agent_id=10)
+            raise RuntimeError("socket broken")
+
+    await manager.connect("agent", ReconnectingWebSocket(), env_id=1, agent_id=10)
+
+    assert await manager.broadcast_to_env_clients(1, {"x": 1}) == 0
+    assert manager.conns[ClientType.AGENT][(10, 1)] is fresh_ws
+    assert fresh_ws.closed is None
+
+
+@pytest.mark.asyncio
+async def test_broadcast_closes_timed_out_clients():
+    """A recipient slower than broadcast_timeout is closed, not just unregistered."""
+    manager = ConnectionManager(broadcast_timeout=0.05)
+    fast_ws, slow_ws = FakeWebSocket(), FakeWebSocket(delay=1)
+    await manager.connect("agent", fast_ws, env_id=1, agent_id=10)
+    await manager.connect("agent", slow_ws, env_id=1, agent_id=11)
+
+    assert await manager.broadcast_to_env_clients(1, {"x": 1}) == 1
+    assert fast_ws.closed is None
+    assert slow_ws.closed is not None
+    assert not slow_ws.sent
+    assert (11, 1) not in manager.conns[ClientType.AGENT]
+
+
+@pytest.mark.asyncio
+async def test_old_socket_disconnect_after_reconnect_keeps_new_connection():
+    """Tearing down a replaced socket leaves the reconnected client registered."""
+    manager = ConnectionManager()
+    old_ws, new_ws = FakeWebSocket(), FakeWebSocket()
+    await manager.connect("agent", old_ws, env_id=1, agent_id=10)
+    await manager.disconnect("agent", old_ws, env_id=1, agent_id=10)
+    await manager.connect("agent", new_ws, env_id=1, agent_id=10)
+    key = new_ws.state.connection_key
+
+    await manager.disconnect("agent", old_ws, env_id=1, agent_id=10)
+
+    assert manager.conns[ClientType.AGENT][(10, 1)] is new_ws
+    assert manager.env_members[ClientType.AGENT][1][10] is new_ws
+    assert key in manager.connection_times
+
+
+@pytest.mark.asyncio
+async def test_old_env_socket_disconnect_after_reconnect_keeps_new_env():
+    """A replaced environment socket cannot drop the environment's new socket."""
+    manager = ConnectionManager()
+    old_ws, new_ws = FakeWebSocket(), FakeWebSocket()
+    await manager.connect("env", old_ws, env_id=1)
+    await manager.connect("env", new_ws, env_id=1)
+
+    await manager.disconnect("env", old_ws, env_id=1)
+
+    assert manager.envs[1] is new_ws
+    assert new_ws.state.connection_key in manager.connection_times
+
+
+@pytest.mark.asyncio
+async def test_rejected_duplicate_disconnect_keeps_live_connection():
+    """Cleaning up a rejected duplicate connect leaves the live socket alone."""
+    manager = ConnectionManager()
+    live_ws, dup_ws = FakeWebSocket(), FakeWebSocket()
+    await manager.connect("human", live_ws, env_id=1, human_id=20)
+    with pytest.raises(DuplicateConnectionError):
+        await manager.connect("human", dup_ws, env_id=1, human_id=20)
+
+    await manager.disconnect("human", dup_ws, env_id=1, human_id=20)
+
+    assert manager.conns[ClientType.HUMAN][(20, 1)] is live_ws
+    assert live_ws.state.connection_key in manager.connection_times